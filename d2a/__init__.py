@@ -1,129 +1,327 @@
 # coding: utf-8
+import re
 import importlib
+import threading
 import types
 import sys
 from collections import OrderedDict
 
 from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, router
 
 from sqlalchemy import Column, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, configure_mappers, relationship
+from sqlalchemy.orm.attributes import manager_of_class
 
 from .parsers import parse_models, parse_model
+from .cache import SchemaCache
+from .schema import SchemaRegistry
 
-from .fields import alias, alias_dict, JSONType
+from .fields import alias, alias_dict, JSONType, DB_TYPES
 from .db import (
     AUTO_DETECTED_DB_TYPE,
-    query_expression, execute_expression,
-    make_engine, make_session,
+    query_expression, execute_expression, execute_many, explain_expression,
+    copy_into, copy_out,
+    make_engine, make_session, reset_engines,
+    bind_metadata, detect_database, _detect_db_type,
+    STREAM_CHUNK_SIZE, row_class,
 )
+from .aio import aquery_expression, aexecute_expression
 from .utils import get_camelcase
 
-DB_TYPES = ['postgresql', 'mysql', 'oracle', 'sqlite3', 'firebird', 'mssql', 'default']
-
-
 D2A_CONFIG = getattr(settings, 'D2A_CONFIG', {})
 alias_dict(D2A_CONFIG.get('ALIASES', {}))
 NAME_FORMATTER = D2A_CONFIG.get('NAME_FORMATTER', lambda name: get_camelcase(name, capitalize=True))
 
+# the loading strategy (`lazy`) by the kind of relationships, `many_to_one`, `one_to_many`, `one_to_one`
+# or `many_to_many`. The kinds not configured are `select` (the default of SQLAlchemy).
+# `{"one_to_many": "selectin", "many_to_many": "selectin"}` is recommended to load collections without N+1 queries
+# (`selectin` needs SQLAlchemy 1.2, use `subquery` before that).
+# They are overridden by `lazy` of REL_PARAMS per relationship, for example, `{"Book.category": {"lazy": "joined"}}`.
+# `sqla_codegen` renders the same.
+RELATIONSHIP_LOADING = D2A_CONFIG.get('RELATIONSHIP_LOADING', {})
+REL_PARAMS = D2A_CONFIG.get('REL_PARAMS', {})
+
+SCHEMA_CACHE = D2A_CONFIG.get('SCHEMA_CACHE')
+schema_cache = SchemaCache(**SCHEMA_CACHE) if SCHEMA_CACHE else None
+# the snapshots of parsed models shared by `declare` and `sqla_codegen`.
+schemas = SchemaRegistry(schema_cache.parse_model if schema_cache else parse_model)
+
 Base = declarative_base()
+bind_metadata(Base.metadata, DEFAULT_DB_ALIAS)
+# django databases to the declarative bases, each database has its own metadata (see `get_base`).
+bases = {DEFAULT_DB_ALIAS: Base}
+# django models to the declared models. It is read without locks, the entries are added once and never replaced.
 existing = {}
+# django models to the locks, each model is declared once even if it is declared by several threads at the same time.
+_model_locks = {}
+_model_locks_lock = threading.Lock()
+# the declarative classes are made one by one as they change the registry of `Base`.
+_base_lock = threading.RLock()
+_autoload_lock = threading.RLock()
+
+
+def _model_lock(django_model):
+    with _model_locks_lock:
+        return _model_locks.setdefault(django_model, threading.RLock())
+
+
+def get_base(database=DEFAULT_DB_ALIAS):
+    """It returns the declarative base of the django database, `Base` for `default`."""
+    base = bases.get(database)
+    if base is not None:
+        return base
+    with _base_lock:
+        if database not in bases:
+            base = declarative_base()
+            bind_metadata(base.metadata, database)
+            bases[database] = base
+        return bases[database]
 
 
 def _extract_kwargs(kwargs):
     return {k: v for k, v in kwargs.items() if not (k.startswith('__') and k.endswith('__'))}
 
 
-def declare(django_model, db_type=AUTO_DETECTED_DB_TYPE, back_type='backref'):
+def _relationship_kinds(rel_option):
+    """It returns the kinds of the relationship and its back relation."""
+    if '__secondary_model__' in rel_option:
+        return 'many_to_many', 'many_to_many'
+    if rel_option.get('uselist') is False:
+        return 'one_to_one', 'one_to_one'
+    return 'many_to_one', 'one_to_many'
+
+
+def _loading(django_model, name, kind):
+    model_name = NAME_FORMATTER(django_model._meta.object_name)
+    params = dict(REL_PARAMS.get('*', {}), **REL_PARAMS.get('{}.{}'.format(model_name, name), {}))
+    return params.get('lazy', RELATIONSHIP_LOADING.get(kind))
+
+
+def declare(django_model, db_type=None, back_type='backref', database=None):
     """It converts a django model to alchemy orm object.
+    The model is declared on the base of its database (see `get_base`), once for the first database.
     :param django.db.models.base.Model django_model: Django model object or equivalent object.
-    :param str db_type: Database type, for example `postgresql`. If omitted this option, it will be detected from django settings.
+    :param str db_type: Database type, for example `postgresql`.
+      If omitted this option, it will be detected from the database.
     :param str back_type: Back relation type, `backref` or ``None`` (it does not support `back_populates`).
+    :param str database: The django database.
+      If omitted this option, it will be chosen by the database routers (`db_for_write`).
     This function is also called from `transfer` :)
     """
 
-    model_info = parse_model(django_model)
-    if django_model in existing:
-        return existing[django_model]
+    alchemy_model = existing.get(django_model)
+    if alchemy_model is not None:
+        return alchemy_model
+
+    with _model_lock(django_model):
+        alchemy_model = existing.get(django_model)
+        if alchemy_model is not None:
+            return alchemy_model
+        return _declare(django_model, db_type, back_type, database)
+
+
+def _database_of(django_model, database=None):
+    """It returns the django database which the model is declared on, or will be."""
+    alchemy_model = existing.get(django_model)
+    if alchemy_model is not None:
+        return alchemy_model.metadata.info['database']
+    return database or router.db_for_write(django_model) or DEFAULT_DB_ALIAS
+
+
+def _declare(django_model, db_type, back_type, database):
+    routed = _database_of(django_model, database)
+    db_type = db_type or _detect_db_type(routed)
+    schema = schemas.get(django_model)
 
     rel_options = OrderedDict()
-    attrs = OrderedDict({'__tablename__': model_info['table_name']})
-    for name, fields in model_info['fields'].items():
-        rel_option = fields.get('__rel_kwargs__', {})
+    attrs = OrderedDict({'__tablename__': schema.table_name})
+    for name, field in schema.fields.items():
+        # relations across databases are omitted as django does not allow them, only the column remains.
+        joinable = field.rel_kwargs and _database_of(field.rel_kwargs['__related_model__'], database) == routed
+        # the snapshot is shared, the options are copied before being completed.
+        rel_option = dict(field.rel_kwargs) if joinable else {}
         if rel_option:
             rel_options[name] = rel_option
 
-        col_types = {}
-        col_type_options = {}
-        for _db_type in DB_TYPES:
-            col_types[_db_type] = fields.get('__{}_type__'.format(_db_type), None)
-            col_type_options[_db_type] = fields.get('__{}_type_kwargs__'.format(_db_type), {})
-
-        type_key = 'default' if col_types.get(db_type) is None else db_type
-        if col_types[type_key]:
-            col_args = [col_types[type_key](**col_type_options[type_key])]
-            if '__fk_kwargs__' in fields:
-                col_args.append(ForeignKey(**_extract_kwargs(fields['__fk_kwargs__'])))
+        column_type = field.column_type(db_type)
+        if column_type:
+            col_args = [column_type.type(**column_type.kwargs)]
+            if field.fk_kwargs is not None and joinable:
+                col_args.append(ForeignKey(**_extract_kwargs(field.fk_kwargs)))
 
-            column = attrs[name] = Column(*col_args, **_extract_kwargs(fields))
+            column = attrs[name] = Column(*col_args, **field.column_kwargs)
             rel_option['foreign_keys'] = [column]
 
     for logical_name, rel_option in rel_options.items():
         if '__secondary_model__' in rel_option:
-            secondary = rel_option['secondary'] = declare(rel_option['__secondary_model__'], db_type=db_type, back_type=back_type).__table__
-        
+            secondary = rel_option['secondary'] = declare(
+                rel_option['__secondary_model__'], db_type=db_type, back_type=back_type, database=routed,
+            ).__table__
+            # the table name in the string is resolved to the declared class of the intermediate model (it has no `.c`).
+            fk_fields = [rel_option['__remote_primary_field__']]
+            if rel_option['__model__'] != rel_option['__related_model__']:
+                fk_fields.append(rel_option['__remote_secondary_field__'])
+            rel_option['foreign_keys'] = [secondary.c[field] for field in fk_fields]
+
         if '__logical_name__' in rel_option:
             logical_name = rel_option['__logical_name__']
 
+        if isinstance(rel_option.get('remote_side'), str):
+            # it refers the model itself, whose columns are declared above.
+            rel_option['remote_side'] = [attrs[name] for name in re.findall(r'\.c\.(\w+)', rel_option['remote_side'])]
+
+        kind, back_kind = _relationship_kinds(rel_option)
+        lazy = _loading(django_model, logical_name, kind)
+        if lazy:
+            rel_option['lazy'] = lazy
+
         back = rel_option.get('__back__', None)
         if back and back_type:
-            rel_option[back_type] = back.rstrip('+').lower()
+            back = back.rstrip('+').lower()
+            back_lazy = _loading(rel_option['__related_model__'], back, back_kind)
+            rel_option[back_type] = backref(back, lazy=back_lazy) if back_lazy and back_type == 'backref' else back
 
         attrs[logical_name] = relationship(rel_option['__target__'], **_extract_kwargs(rel_option))
 
-    cls = existing[django_model] = type(model_info['table_name'], (Base,), attrs)
+    with _base_lock:
+        cls = existing[django_model] = type(schema.table_name, (get_base(routed),), attrs)
     return cls
 
 
-def transfer(models, exports, db_type=AUTO_DETECTED_DB_TYPE, back_type='backref', as_table=False, name_formatter=NAME_FORMATTER):
+def transfer(models, exports, db_type=None, back_type='backref', as_table=False, name_formatter=NAME_FORMATTER,
+             database=None):
     """It makes sqlalchemy model objects from django models.
 
     :param module models: Django `models.py` or equivalent object.
     :param dict exports: Namespace which you want to put the models into. In most case, that is ``globals()``.
-    :param str db_type: Database type, for example `postgresql`. If omitted this option, it will be detected from django settings.
+    :param str db_type: Database type, for example `postgresql`.
+      If omitted this option, it will be detected from the database of each model.
     :param str back_type: Back relation type, `backref` or ``None`` (it does not support `back_populates`).
     :param bool as_table: Whether outputting as `SQL Expression` schema (``orm.__table__``) or not.
     :param function name_formatter: It receives an argument (model name) as ``str``, and returns formetted model name.
+    :param str database: The django database.
+      If omitted this option, each model goes to the database chosen by the database routers.
     """
 
     for model in parse_models(models).values():
-        declare(model, db_type=db_type, back_type=back_type)
+        declare(model, db_type=db_type, back_type=back_type, database=database)
 
-    for django_model, alchemy_model in existing.items():
+    # a copy, other threads may be declaring models.
+    for django_model, alchemy_model in existing.copy().items():
         if models.__name__ == django_model.__module__:
             key = name_formatter(django_model._meta.object_name)
             exports[key] = alchemy_model.__table__ if as_table else alchemy_model
 
 
+def _declare_with_dependencies(django_model, db_type=None, back_type='backref', database=None):
+    """It declares the model and the models which it refers by foreign keys and many to many fields, transitively.
+    """
+    pending = [django_model]
+    while pending:
+        model = pending.pop()
+        if model in existing:
+            continue
+        declare(model, db_type=db_type, back_type=back_type, database=database)
+        for field in model._meta.fields + model._meta.many_to_many:
+            if field.is_relation and field.related_model is not None:
+                pending.append(field.related_model)
+
+
+def lazy_transfer(models, exports, db_type=None, back_type='backref', as_table=False, name_formatter=NAME_FORMATTER,
+                  database=None):
+    """It is the lazy version of `transfer`.
+    Each model is declared (with the models it depends on) on the first access to the attribute of the module.
+    The parameters are the same as `transfer`. It requires Python 3.7 or later (PEP 562).
+
+    .. note:: Back relations (`backref`) of a model appear after the model referring it is declared.
+    """
+    django_models = {
+        name_formatter(model._meta.object_name): model
+        for model in parse_models(models).values()
+        if models.__name__ == model.__module__
+    }
+
+    def __getattr__(name):
+        if name not in django_models:
+            raise AttributeError('module {!r} has no attribute {!r}'.format(exports.get('__name__'), name))
+
+        _declare_with_dependencies(django_models[name], db_type=db_type, back_type=back_type, database=database)
+        alchemy_model = existing[django_models[name]]
+        exports[name] = alchemy_model.__table__ if as_table else alchemy_model
+        return exports[name]
+
+    def __dir__():
+        return sorted(set(exports) | set(django_models))
+
+    exports['__getattr__'] = __getattr__
+    exports['__dir__'] = __dir__
+
+
+def to_alchemy(queryset, chunk_size=STREAM_CHUNK_SIZE, as_table=False, db_type=None, back_type='backref'):
+    """It converts the rows of a django queryset into instances of the `declare`d model, lazily.
+
+    :param django.db.models.QuerySet queryset: Django queryset.
+    :param int chunk_size: The number of rows read by `values_list` at once.
+    :param bool as_table: If true, it yields rows of the table (`d2a.db.Row`) instead of the instances.
+    :param str db_type: Database type, for example `postgresql`.
+      If omitted this option, it will be detected from the database.
+    :param str back_type: Back relation type, `backref` or ``None`` (it does not support `back_populates`).
+
+    .. note:: The instances are transient, their attributes are filled without history.
+    """
+    alchemy_model = declare(queryset.model, db_type=db_type, back_type=back_type)
+    table = alchemy_model.__table__
+    # column names to django field names
+    columns = OrderedDict(
+        (name, field.logical_name)
+        for name, field in schemas.get(queryset.model).fields.items()
+        if name in table.c
+    )
+    rows = queryset.values_list(*columns.values()).iterator(chunk_size=chunk_size)
+    if as_table:
+        return map(row_class(tuple(columns)), rows)
+
+    keys = tuple(columns)
+    # `new_instance` does not configure mappers unlike the constructor.
+    configure_mappers()
+    new_instance = manager_of_class(alchemy_model).new_instance
+
+    def instantiate(row):
+        instance = new_instance()
+        instance.__dict__.update(zip(keys, row))
+        return instance
+
+    return map(instantiate, rows)
+
+
 def autoload(config=D2A_CONFIG.get('AUTOLOAD', {})):
     """It loads all models automatically.
+    If `lazy` is true, each model is declared on the first access instead (see `lazy_transfer`).
     """
     module = config.get('module', 'models_sqla')
     option = config.get('option', {})
-    for app in settings.INSTALLED_APPS:
-        mods = app.split('.')
-        for i in range(1, len(mods) + 1):
-            mod = '.'.join(mods[:i])
-            d = '{mod}.models'.format(mod=mod)
-            a = '{mod}.{module}'.format(mod=mod, module=module)
-            if importlib.util.find_spec(d) is None:
-                continue
-            try:
-                importlib.import_module(a)
-            except ImportError:
-                sys.modules[a] = types.ModuleType(a)
-                transfer(importlib.import_module(d), sys.modules[a].__dict__, **option)
+    load = lazy_transfer if config.get('lazy', False) else transfer
+    with _autoload_lock:
+        for app in settings.INSTALLED_APPS:
+            mods = app.split('.')
+            for i in range(1, len(mods) + 1):
+                mod = '.'.join(mods[:i])
+                d = '{mod}.models'.format(mod=mod)
+                a = '{mod}.{module}'.format(mod=mod, module=module)
+                if importlib.util.find_spec(d) is None:
+                    continue
+                try:
+                    importlib.import_module(a)
+                except ImportError:
+                    # it is published after loaded, other threads never see the module half loaded.
+                    exports = types.ModuleType(a)
+                    load(importlib.import_module(d), exports.__dict__, **option)
+                    sys.modules[a] = exports
+
+        if schema_cache:
+            schema_cache.save()
 
 
 default_app_config = "d2a.apps.D2aConfig"
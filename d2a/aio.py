@@ -0,0 +1,179 @@
+# coding: utf-8
+"""Coroutine versions of `query_expression` and `execute_expression`.
+
+The statements are compiled through the same dialect mapping as `d2a.db`,
+and executed on an async driver (`asyncpg` for PostgreSQL, `aiomysql` for MySQL)
+with a pool made from ``settings.DATABASES`` once per event loop.
+"""
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .db import D2A_CONFIG, DIALECTS, _compile, _detect_db_type, _row_factory, detect_database
+from .utils import numeric_sql
+
+ASYNC_POOL_OPTIONS = D2A_CONFIG.get('ASYNC_POOL_OPTIONS', {})
+
+logger = logging.getLogger(__name__)
+
+# event loop -> {database: a future of the pool}
+_pools = weakref.WeakKeyDictionary()
+
+
+def _connect_kwargs(database, db_type):
+    db = settings.DATABASES[database]
+    kwargs = {
+        'host': db.get('HOST'),
+        'port': int(db['PORT']) if db.get('PORT') else None,
+        'user': db.get('USER'),
+        'password': db.get('PASSWORD'),
+        'database' if db_type == 'postgresql' else 'db': db.get('NAME'),
+    }
+    kwargs = {k: v for k, v in kwargs.items() if v}
+    kwargs.update(ASYNC_POOL_OPTIONS.get(db_type, {}))
+    return kwargs
+
+
+async def _asyncpg_pool(kwargs):
+    import asyncpg
+    return await asyncpg.create_pool(**kwargs)
+
+
+async def _asyncpg_close(pool):
+    await pool.close()
+
+
+async def _asyncpg_fetch(conn, sql, params):
+    sql, names = numeric_sql(sql)
+    return [tuple(record) for record in await conn.fetch(sql, *[params[name] for name in names])]
+
+
+async def _asyncpg_execute(conn, sql, params):
+    sql, names = numeric_sql(sql)
+    # the status is like `UPDATE 2` or `INSERT 0 1`.
+    count = (await conn.execute(sql, *[params[name] for name in names])).rsplit(' ', 1)[-1]
+    return int(count) if count.isdigit() else -1
+
+
+async def _aiomysql_pool(kwargs):
+    import aiomysql
+    return await aiomysql.create_pool(**dict({'autocommit': True}, **kwargs))
+
+
+async def _aiomysql_close(pool):
+    pool.close()
+    await pool.wait_closed()
+
+
+async def _aiomysql_fetch(conn, sql, params):
+    async with conn.cursor() as cursor:
+        await cursor.execute(sql, params)
+        return list(await cursor.fetchall())
+
+
+async def _aiomysql_execute(conn, sql, params):
+    async with conn.cursor() as cursor:
+        await cursor.execute(sql, params)
+        return cursor.rowcount
+
+
+POOL_MAPPING = {
+    'postgresql': _asyncpg_pool,
+    'mysql': _aiomysql_pool,
+}
+
+CLOSE_MAPPING = {
+    'postgresql': _asyncpg_close,
+    'mysql': _aiomysql_close,
+}
+
+FETCH_MAPPING = {
+    'postgresql': _asyncpg_fetch,
+    'mysql': _aiomysql_fetch,
+}
+
+EXECUTE_MAPPING = {
+    'postgresql': _asyncpg_execute,
+    'mysql': _aiomysql_execute,
+}
+
+
+def _detect_async_db_type(database):
+    db_type = _detect_db_type(database)
+    if db_type not in POOL_MAPPING:
+        raise ValueError('The database {!r} ({}) is not supported by the async api.'.format(database, db_type))
+    return db_type
+
+
+async def get_pool(database='default'):
+    """It returns the pool of the async driver for the django database.
+    The pool is made on the first call in each event loop.
+    """
+    pools = _pools.setdefault(asyncio.get_event_loop(), {})
+    if database not in pools:
+        db_type = _detect_async_db_type(database)
+        pools[database] = asyncio.ensure_future(POOL_MAPPING[db_type](_connect_kwargs(database, db_type)))
+    try:
+        return await pools[database]
+    except Exception:
+        pools.pop(database, None)
+        raise
+
+
+async def close_pools():
+    """It closes the pools made in the current event loop."""
+    pools = _pools.pop(asyncio.get_event_loop(), {})
+    for database, future in pools.items():
+        if future.done() and not future.exception():
+            await CLOSE_MAPPING[_detect_db_type(database)](future.result())
+
+
+async def _run(func, conn, database, sql, params):
+    if conn is None:
+        pool = await get_pool(database)
+        async with pool.acquire() as conn:
+            return await _run(func, conn, database, sql, params)
+    try:
+        return await func(conn, sql, params)
+    except Exception:
+        logger.exception('param:%s\nsql:%s', params, sql)
+        raise
+
+
+async def aquery_expression(stmt, conn=None, database=None, as_col_dict=True, dict_method=OrderedDict,
+                            as_record=False):
+    """The coroutine version of `query_expression`.
+    Unlike `query_expression`, the error of the statement is raised after it is logged.
+
+    :stmt: sqlalchemy expression object
+    :conn:
+      default: None,
+      a connection of the async driver, for example, acquired from `get_pool` to run in a transaction.
+      if omitted, a connection is acquired from the pool of `database` for the statement.
+    :database:
+      default: None, see `query_expression`.
+    :as_col_dict:
+      default: True,
+    :as_record:
+      default: False, see `query_expression`.
+    """
+    database = database or detect_database(stmt)
+    db_type = _detect_async_db_type(database)
+    sql, params = _compile(stmt, DIALECTS[db_type])
+    rows = await _run(FETCH_MAPPING[db_type], conn, database, sql, params)
+    if not as_col_dict:
+        return rows
+    return list(map(_row_factory(stmt, as_record, dict_method), rows))
+
+
+async def aexecute_expression(stmt, conn=None, database=None):
+    """The coroutine version of `execute_expression`, it returns the number of the affected rows.
+    Unlike `execute_expression`, the error of the statement is raised after it is logged.
+    """
+    database = database or detect_database(stmt)
+    db_type = _detect_async_db_type(database)
+    sql, params = _compile(stmt, DIALECTS[db_type])
+    return await _run(EXECUTE_MAPPING[db_type], conn, database, sql, params)
@@ -0,0 +1,220 @@
+# coding: utf-8
+import io
+import os
+import sys
+import atexit
+import pickle
+import hashlib
+import importlib
+import logging
+import threading
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.db.models.base import ModelBase
+
+from .parsers import parse_model
+from .utils import stable_repr
+
+logger = logging.getLogger(__name__)
+
+
+class _Pickler(pickle.Pickler):
+    # django models (including auto created intermediate models) are stored as their labels.
+    def persistent_id(self, obj):
+        if isinstance(obj, ModelBase):
+            return obj._meta.label
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        return apps.get_model(pid)
+
+
+def _dumps(obj):
+    f = io.BytesIO()
+    _Pickler(f, pickle.HIGHEST_PROTOCOL).dump(obj)
+    return f.getvalue()
+
+
+def _picklable(obj):
+    try:
+        _dumps(obj)
+    except (pickle.PicklingError, AttributeError, TypeError):
+        return False
+    return True
+
+
+def _source_files():
+    """It returns paths of modules which define models and their fields, and the d2a mapping."""
+    from . import fields
+    modules = {fields.__name__}
+    field_types = set()
+    for model in apps.get_models(include_auto_created=True):
+        modules.add(model.__module__)
+        # the fields declared on the model, `get_fields` would build the reverse relations of all models.
+        opts = model._meta
+        field_types.update(type(field) for field in opts.local_fields + opts.local_many_to_many + opts.private_fields)
+    modules.update(field_type.__module__ for field_type in field_types)
+
+    paths = set()
+    for name in modules:
+        path = getattr(sys.modules.get(name), '__file__', None)
+        if path:
+            paths.add(path)
+    return sorted(paths)
+
+
+# D2A_CONFIG settings and d2a modules which parsed models (and the generated code) depend on.
+CONFIG_KEYS = [
+    'ALIASES', 'NAME_FORMATTER', 'MISSING', 'USE_GEOALCHEMY2', 'RELATIONSHIP_LOADING',
+    'REL_PARAMS', 'COL_PARAMS', 'TYPE_PARAMS', 'TYPES', 'BLOCKS',
+]
+CONFIG_MODULES = ['d2a', 'd2a.fields', 'd2a.parsers', 'd2a.schema']
+
+
+def _mapping_repr():
+    from .fields import mapping
+    # an aliased field type shares the rule of the existing one, which is represented by the first field type.
+    field_types = sorted(mapping, key=stable_repr)
+    rules = {}
+    for field_type in field_types:
+        rules.setdefault(id(mapping[field_type]), stable_repr(field_type))
+    return [(stable_repr(field_type), rules[id(mapping[field_type])]) for field_type in field_types]
+
+
+def config_key(*extra, modules=()):
+    """It returns the hash of the settings, the mapping (including `alias` at runtime) and the sources
+    which parsed models depend on. `extra` values and `modules` are hashed together.
+    """
+    d2a_config = getattr(settings, 'D2A_CONFIG', {})
+    digest = hashlib.sha1()
+    digest.update(stable_repr([
+        {key: d2a_config.get(key) for key in CONFIG_KEYS}, _mapping_repr(), list(extra),
+    ]).encode())
+    for module in CONFIG_MODULES + list(modules):
+        with open(importlib.import_module(module).__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _applied_migrations(database):
+    from django.db.migrations.recorder import MigrationRecorder
+    connection = connections[database]
+    opened = connection.connection is None
+    try:
+        return sorted(MigrationRecorder(connection).applied_migrations())
+    finally:
+        # e.g. `autoload` runs on its own thread, the connection opened for the key is not left behind.
+        if opened:
+            connection.close()
+
+
+class SchemaCache(object):
+    """A file cache of parsed models (the result of `parse_model`).
+
+    The cache is keyed by the applied migrations, the modification times of the sources defining models
+    and `config_key`, it is discarded automatically when any of them changes.
+    The cached models are loaded at once and kept in memory, `parse_model` returns them as they are.
+
+    :param str path: The cache file path.
+    :param str database: The django database which migrations are read from.
+    """
+
+    def __init__(self, path, database='default'):
+        self.path = path
+        self.database = database
+        self.key = None
+        self._entries = None
+        self._dirty = False
+        self._registered = False
+        self._lock = threading.RLock()
+
+    def make_key(self):
+        digest = hashlib.sha1()
+        digest.update(repr(_applied_migrations(self.database)).encode())
+        digest.update(config_key().encode())
+        for path in _source_files():
+            stat = os.stat(path)
+            digest.update('{}:{}:{}'.format(path, stat.st_mtime_ns, stat.st_size).encode())
+        return digest.hexdigest()
+
+    def load(self):
+        with self._lock:
+            if self._entries is not None:
+                return
+            self._entries = {}
+            try:
+                self.key = self.make_key()
+            except Exception:
+                logger.warning('The schema cache is disabled because its key could not be made.', exc_info=True)
+                return
+
+            try:
+                with open(self.path, 'rb') as f:
+                    # the key is stored ahead of the models, which are not loaded unless it matches.
+                    if pickle.load(f) != self.key:
+                        return
+                    entries = _Unpickler(f).load()
+            except (IOError, OSError):
+                return
+            except Exception:
+                logger.warning('The schema cache %s is broken, it will be rebuilt.', self.path, exc_info=True)
+                return
+
+            if isinstance(entries, dict):
+                self._entries = entries
+
+    def parse_model(self, model):
+        """It returns the same as `parse_model` but the cached one if available."""
+        self.load()
+        label = model._meta.label
+        info = self._entries.get(label)
+        if info is not None:
+            return info
+
+        info = parse_model(model)
+        if self.key is None:
+            return info
+
+        with self._lock:
+            self._entries[label] = info
+            self._dirty = True
+            if not self._registered:
+                atexit.register(self.save)
+                self._registered = True
+        return info
+
+    def save(self):
+        with self._lock:
+            if not self._dirty or self.key is None:
+                return
+            try:
+                data = _dumps(self._entries)
+            except (pickle.PicklingError, AttributeError, TypeError):
+                # e.g. a lambda given as the default value, such models are parsed every time.
+                entries = {label: info for label, info in self._entries.items() if _picklable(info)}
+                logger.debug(
+                    '%s are not cached because they could not be pickled.', sorted(set(self._entries) - set(entries)),
+                )
+                data = _dumps(entries)
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            try:
+                with open(tmp_path, 'wb') as f:
+                    pickle.dump(self.key, f, pickle.HIGHEST_PROTOCOL)
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except (IOError, OSError):
+                logger.warning('The schema cache %s could not be saved.', self.path, exc_info=True)
+                return
+            self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+            self._dirty = False
+            self.key = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
@@ -1,22 +1,67 @@
 # coding: utf-8
+import os
 import re
+import json
+import time
+import random
+import inspect
+import importlib
+import queue
+import itertools
 import logging
 import warnings
+import threading
 from collections import OrderedDict
+from collections.abc import Mapping
 from contextlib import contextmanager
+from functools import lru_cache
 
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import dialects, create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy import dialects, create_engine, event, Table
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql import sqltypes
+from sqlalchemy.sql.expression import Insert
+from sqlalchemy.sql.util import find_tables
+from sqlalchemy.dialects.postgresql import HSTORE
 from django.conf import settings
-from django.db import transaction
+from django.db import DEFAULT_DB_ALIAS, transaction
 
 from .compat import basestring
+from .utils import fingerprint
+from .signals import statement_executed
+from .plans import PlanStore, explain
+from .slowlog import SlowQueryLog
+from .replicas import ReplicaRouter
+from .prepared import PreparedStatements, is_missing, _in_transaction
 
-DIALECTS = {
-    t: getattr(dialects, t).dialect
-    for t in ['postgresql', 'mysql', 'oracle', 'mssql', 'sqlite', 'firebase']
-    if hasattr(dialects, t)
-}
+D2A_CONFIG = getattr(settings, 'D2A_CONFIG', {})
+STREAM_CHUNK_SIZE = D2A_CONFIG.get('STREAM_CHUNK_SIZE', 2000)
+EXECUTE_MANY_BATCH_SIZE = D2A_CONFIG.get('EXECUTE_MANY_BATCH_SIZE', 1000)
+COPY_BUFFER_SIZE = D2A_CONFIG.get('COPY_BUFFER_SIZE', 8192)
+# e.g. {'pool_size': 5, 'max_overflow': 10, 'pool_recycle': 3600, 'pool_pre_ping': True}
+ENGINE_OPTIONS = D2A_CONFIG.get('ENGINE_OPTIONS', {})
+INSTRUMENTATION_SAMPLE_RATE = D2A_CONFIG.get('INSTRUMENTATION_SAMPLE_RATE', 1.0)
+# e.g. {'path': 'plans.json', 'seq_scan_rows': 10000, 'cost_tolerance': 0.2}, see `d2a.plans.PlanStore`.
+PLAN_STORE = D2A_CONFIG.get('PLAN_STORE')
+plan_store = PlanStore(**PLAN_STORE) if PLAN_STORE else None
+# e.g. {'threshold': 500, 'size': 100, 'path': 'slow_queries.sqlite3', 'explain': True}, see `d2a.slowlog.SlowQueryLog`.
+SLOW_QUERY_LOG = D2A_CONFIG.get('SLOW_QUERY_LOG')
+slow_query_log = SlowQueryLog(**SLOW_QUERY_LOG) if SLOW_QUERY_LOG else None
+# e.g. {'replicas': {'default': ['replica1', 'replica2']}, 'policy': 'least_loaded'}, see `d2a.replicas.ReplicaRouter`.
+REPLICAS = D2A_CONFIG.get('REPLICAS', {})
+replica_router = ReplicaRouter(**REPLICAS)
+# e.g. {'size': 100}, see `d2a.prepared.PreparedStatements`.
+PREPARED_STATEMENTS = D2A_CONFIG.get('PREPARED_STATEMENTS')
+prepared_statements = PreparedStatements(**PREPARED_STATEMENTS) if PREPARED_STATEMENTS else None
+
+DIALECTS = {}
+for t in ['postgresql', 'mysql', 'oracle', 'mssql', 'sqlite', 'firebase']:
+    try:
+        # the dialect packages are not attributes of `sqlalchemy.dialects` until they are imported.
+        DIALECTS[t] = importlib.import_module('{}.{}'.format(dialects.__name__, t)).dialect
+    except ImportError:
+        pass
 
 EXPLAIN_PREFIXES = {
     'postgresql': 'EXPLAIN ANALYZE',
@@ -25,40 +70,51 @@ EXPLAIN_PREFIXES = {
     'sqlite': 'EXPLAIN QUERY PLAN',
 }
 
-DIALECT_MAPPING = {}
+# django calls it `sqlite3`.
+if 'sqlite' in DIALECTS:
+    DIALECTS['sqlite3'] = DIALECTS['sqlite']
+EXPLAIN_PREFIXES['sqlite3'] = EXPLAIN_PREFIXES['sqlite']
+
+SQL_MAPPING = {}
+PARAMS_MAPPING = {}
 
 key = 'postgresql'
 if key in DIALECTS:
     # https://github.com/sqlalchemy/sqlalchemy/blob/f572cdf7850b7a2ee6b7535b8129a76fa73496e6/test/sql/test_compiler.py#L2562
-    DIALECT_MAPPING[DIALECTS[key]] = lambda sql, binded: (
-        sql,
-        binded.params,
-    )
+    SQL_MAPPING[DIALECTS[key]] = lambda sql: sql
+    PARAMS_MAPPING[DIALECTS[key]] = lambda params, positiontup: params
 
 key = 'mysql'
 if key in DIALECTS:
     # https://github.com/sqlalchemy/sqlalchemy/blob/f572cdf7850b7a2ee6b7535b8129a76fa73496e6/test/sql/test_compiler.py#L2583
-    DIALECT_MAPPING[DIALECTS[key]] = lambda sql, binded: (
-        sql,
-        tuple(binded.params[k] for k in binded.positiontup),
-    )
+    SQL_MAPPING[DIALECTS[key]] = lambda sql: sql
+    PARAMS_MAPPING[DIALECTS[key]] = lambda params, positiontup: tuple(params[k] for k in positiontup)
 
 key = 'oracle'
 if key in DIALECTS:
     # https://github.com/sqlalchemy/sqlalchemy/blob/f572cdf7850b7a2ee6b7535b8129a76fa73496e6/test/sql/test_compiler.py#L2569
-    DIALECT_MAPPING[DIALECTS[key]] = lambda sql, binded: (
-        re.sub(r"(?<!:):([A-Za-z][0-9A-Za-z_]+)", r"%(\1)s", sql),
-        binded.params,
-    )
+    SQL_MAPPING[DIALECTS[key]] = lambda sql: re.sub(r"(?<!:):([A-Za-z][0-9A-Za-z_]+)", r"%(\1)s", sql)
+    PARAMS_MAPPING[DIALECTS[key]] = lambda params, positiontup: params
 
 key = 'sqlite'
 if key in DIALECTS:
     # https://github.com/sqlalchemy/sqlalchemy/blob/f572cdf7850b7a2ee6b7535b8129a76fa73496e6/test/sql/test_compiler.py#L2599
-    DIALECT_MAPPING[DIALECTS[key]] = lambda sql, binded: (
-        sql.replace('?', '%s'),
-        tuple(binded.params.values()),
+    SQL_MAPPING[DIALECTS[key]] = lambda sql: sql.replace('?', '%s')
+    PARAMS_MAPPING[DIALECTS[key]] = lambda params, positiontup: tuple(params[k] for k in positiontup)
+
+
+def _dialect_mapping(sql_mapping, params_mapping):
+    return lambda sql, binded: (
+        sql_mapping(sql),
+        params_mapping(binded.params, getattr(binded, 'positiontup', None)),
     )
 
+
+DIALECT_MAPPING = {
+    dialect: _dialect_mapping(SQL_MAPPING[dialect], PARAMS_MAPPING[dialect])
+    for dialect in SQL_MAPPING
+}
+
 MS_DSN = 'DRIVER={{SQL Server}}; SERVER={HOST}; DATABASE={NAME}; UID={USER}; PWD={PASSWORD};'
 URI = {
     'postgresql': 'postgresql://{USER}:{PASSWORD}@{HOST}:{PORT}/{NAME}',
@@ -90,16 +146,140 @@ def _detect_db_type(database='default'):
     }.get(settings.DATABASES[database]['ENGINE'])
 
 
-def _execute_cursor(cursor, sql, params):
+class _Timer(object):
+    """It measures the phases of a statement and sends `statement_executed`."""
+
+    def __init__(self, sender, source, database):
+        self.sender = sender
+        self.source = source
+        self.database = database
+        self.timings = {'compile_time': None, 'execute_time': None, 'fetch_time': None}
+        self.started = time.perf_counter()
+
+    def restart(self):
+        self.started = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.timings[phase] = (self.timings[phase] or 0) + now - self.started
+        self.started = now
+
+    def send(self, sql, rowcount, exception=None):
+        responses = statement_executed.send_robust(
+            sender=self.sender, source=self.source, database=self.database,
+            sql=sql, fingerprint=fingerprint(sql), rowcount=rowcount, exception=exception, **self.timings
+        )
+        for receiver, response in responses:
+            if isinstance(response, Exception):
+                logger.warning('%r failed to receive statement_executed.', receiver, exc_info=response)
+
+
+class _NullTimer(object):
+    def restart(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def send(self, sql, rowcount, exception=None):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def _make_timer(sender, source, database):
+    if not statement_executed.has_listeners():
+        return _NULL_TIMER
+    if INSTRUMENTATION_SAMPLE_RATE < 1 and random.random() >= INSTRUMENTATION_SAMPLE_RATE:
+        return _NULL_TIMER
+    return _Timer(sender, source, database)
+
+
+def _execute_cursor(cursor, sql, params, reraise=None):
+    started = time.perf_counter()
     try:
         cursor.execute(sql, params)
-    except Exception:
+    except Exception as e:
+        if reraise is not None and reraise(e):
+            raise
         logger.exception('param:%s\nsql:%s', params, sql)
+        return False
+    if slow_query_log is not None:
+        slow_query_log.check(cursor, sql, params, time.perf_counter() - started)
+    return True
+
+
+def _execute_statement(conn, cursor, dialect, sql, params, prepared=True):
+    if not prepared or prepared_statements is None:
+        return _execute_cursor(cursor, sql, params)
+    prepared_sql, prepared_params = prepared_statements.prepare(conn, cursor, dialect.name, sql, params)
+    if prepared_sql == sql:
+        return _execute_cursor(cursor, sql, params)
+    # a failed EXECUTE aborts the transaction on PostgreSQL, the statement could not run as it is after that.
+    savepoint = dialect.name == 'postgresql' and _in_transaction(cursor)
+    if savepoint and not _execute_cursor(cursor, 'SAVEPOINT d2a_execute', None):
+        return False
+    try:
+        # other errors fail as the plain statement does, it must not run twice.
+        executed = _execute_cursor(cursor, prepared_sql, prepared_params, reraise=is_missing)
+    except Exception:
+        # e.g. it was deallocated by `DISCARD ALL` of a connection pooler,
+        # it runs as it is and is prepared again next time.
+        if savepoint:
+            cursor.execute('ROLLBACK TO SAVEPOINT d2a_execute')
+        prepared_statements.forget(conn, sql)
+        return _execute_cursor(cursor, sql, params)
+    if savepoint and executed:
+        # the results of `cursor` are kept.
+        with conn.cursor() as other:
+            other.execute('RELEASE SAVEPOINT d2a_execute')
+    return executed
+
+
+def _execute_many_cursor(cursor, sql, params_list, values_template=None):
+    try:
+        if values_template is None:
+            cursor.executemany(sql, params_list)
+        else:
+            from psycopg2.extras import execute_values
+            execute_values(cursor.cursor, sql, params_list, template=values_template, page_size=len(params_list))
+    except Exception:
+        logger.exception('params:%s\nsql:%s', params_list, sql)
+        raise
+
+
+# it becomes true once a metadata is bound to a database other than `default`,
+# statements are not inspected until then.
+_routing = False
+
+
+def bind_metadata(metadata, database):
+    """It binds the metadata to the django database,
+    the statements on its tables run on the database unless `database` is given (see `detect_database`).
+    `declare` binds the metadata of each declarative base.
+    """
+    global _routing
+    metadata.info['database'] = database
+    if database != DEFAULT_DB_ALIAS:
+        _routing = True
+
+
+def detect_database(stmt):
+    """It returns the django database which the first bound table (see `bind_metadata`) in the statement belongs to,
+    or `default`.
+    """
+    if _routing:
+        for table in find_tables(stmt, include_crud=True):
+            metadata = getattr(table, 'metadata', None)
+            if metadata is not None and 'database' in metadata.info:
+                return metadata.info['database']
+    return DEFAULT_DB_ALIAS
 
 
 def _complement(conn, dialect, database='default'):
     if not conn:
-        conn = transaction.get_connection()
+        conn = transaction.get_connection(database)
     if not dialect:
         dialect = _detect_db_type(database)
     if isinstance(dialect, basestring):
@@ -108,14 +288,307 @@ def _complement(conn, dialect, database='default'):
     return conn, dialect
 
 
-def query_expression(stmt, conn=None, dialect=None, database='default',
-                     as_col_dict=True, as_row_list=True, dict_method=OrderedDict, debug={}):
+class CompiledCache(object):
+    """A bounded LRU cache of compiled statements.
+
+    It maps a pair of the dialect and the structural cache key of a statement to
+    the rendered sql and the compiled object that extracts parameters of later statements.
+    """
+
+    def __init__(self, maxsize=500):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries[key] = value
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+
+compiled_cache = CompiledCache(D2A_CONFIG.get('COMPILED_CACHE_SIZE', 500))
+_dialect_instances = {}
+
+
+def _get_dialect_instance(dialect):
+    instance = _dialect_instances.get(dialect)
+    if instance is None:
+        instance = _dialect_instances[dialect] = dialect()
+    return instance
+
+
+def _compile(stmt, dialect):
+    """It compiles the statement and returns a pair of the sql and its parameters for the dialect.
+    Statements which have a structural cache key (SQLAlchemy 1.4 or later) are compiled only once,
+    later calls just bind new parameter values.
+    """
+    generate_cache_key = getattr(stmt, '_generate_cache_key', None)
+    cache_key = generate_cache_key() if generate_cache_key and compiled_cache.maxsize > 0 else None
+    if cache_key is None:
+        binded = stmt.compile(dialect=_get_dialect_instance(dialect))
+        return DIALECT_MAPPING[dialect](str(binded), binded)
+
+    key = (dialect, cache_key.key)
+    plan = compiled_cache.get(key)
+    if plan is not None:
+        sql, binded = plan
+        params = binded.construct_params(extracted_parameters=cache_key.bindparams)
+        return sql, PARAMS_MAPPING[dialect](params, binded.positiontup)
+
+    binded = stmt.compile(dialect=_get_dialect_instance(dialect), cache_key=cache_key)
+    if binded.literal_execute_params or binded.post_compile_params:
+        # expanding parameters (e.g. `IN`) are rendered into the sql, so it can not be reused.
+        return DIALECT_MAPPING[dialect](str(binded), binded)
+
+    sql = SQL_MAPPING[dialect](str(binded))
+    compiled_cache.put(key, (sql, binded))
+    return sql, PARAMS_MAPPING[dialect](binded.params, binded.positiontup)
+
+
+def _stream_cursor(conn, dialect):
+    if dialect is DIALECTS.get('postgresql'):
+        # a named (server-side) cursor
+        return conn.chunked_cursor()
+    if dialect is DIALECTS.get('mysql'):
+        from MySQLdb.cursors import SSCursor
+        conn.ensure_connection()
+        # an unbuffered cursor, the connection can not run other queries until it is closed.
+        return conn.connection.cursor(SSCursor)
+    return conn.chunked_cursor()
+
+
+def _stream(conn, dialect, sql, params, chunk_size, timer=_NULL_TIMER):
+    cursor = _stream_cursor(conn, dialect)
+    rowcount = 0
+    exception = None
+    try:
+        timer.restart()
+        _execute_cursor(cursor, sql, params)
+        timer.lap('execute_time')
+        while True:
+            timer.restart()
+            rows = cursor.fetchmany(chunk_size)
+            timer.lap('fetch_time')
+            if not rows:
+                break
+            rowcount += len(rows)
+            for row in rows:
+                yield row
+    except Exception as e:
+        exception = e
+        raise
+    finally:
+        cursor.close()
+        timer.send(sql, rowcount, exception)
+
+
+# the most specific type must come first.
+NUMPY_DTYPES = OrderedDict([
+    (sqltypes.Boolean, 'bool'),
+    (sqltypes.Integer, 'int64'),
+    (sqltypes.Float, 'float64'),
+    (sqltypes.Date, 'datetime64[D]'),
+])
+# NULL is converted to NaN or NaT, the others fall back to object arrays.
+NUMPY_NULLABLE_DTYPES = {'float64', 'datetime64[D]'}
+
+
+def _numpy_dtype(type_):
+    if isinstance(type_, sqltypes.TypeDecorator):
+        type_ = type_.impl
+    for sql_type, dtype in NUMPY_DTYPES.items():
+        if isinstance(type_, sql_type):
+            return dtype
+    if isinstance(type_, sqltypes.Numeric) and not type_.asdecimal:
+        return 'float64'
+    return None
+
+
+def _column_array(values, type_):
+    try:
+        import numpy
+    except ImportError:
+        return list(values)
+
+    dtype = _numpy_dtype(type_)
+    if dtype is not None and (dtype in NUMPY_NULLABLE_DTYPES or None not in values):
+        try:
+            return numpy.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    # filling an empty array keeps sequences (e.g. ARRAY columns) as its elements.
+    array = numpy.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _columns(stmt):
+    # `Select.c` is deprecated since SQLAlchemy 1.4, the subquery has the same columns.
+    return list(stmt.subquery().c if hasattr(stmt, 'subquery') else stmt.c)
+
+
+class Row(tuple):
+    """A row of `query_expression` with ``as_record=True``.
+    It is a tuple which is also accessible by the column names, as a mapping or attributes.
+    The column names are shared by the rows through the class made per statement shape (see `row_class`).
+    """
+    __slots__ = ()
+    _keys = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if isinstance(key, basestring):
+            try:
+                key = self._index[key]
+            except KeyError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return tuple.__getitem__(self, self._index[name])
+        except KeyError:
+            raise AttributeError(name)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return self._asdict() == other
+        return tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+    def __repr__(self):
+        return 'Row({})'.format(', '.join('{}={!r}'.format(k, v) for k, v in self.items()))
+
+    def keys(self):
+        return self._keys
+
+    def values(self):
+        return tuple(self)
+
+    def items(self):
+        return list(zip(self._keys, self))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def _asdict(self):
+        return OrderedDict(zip(self._keys, self))
+
+
+@lru_cache(maxsize=D2A_CONFIG.get('COMPILED_CACHE_SIZE', 500))
+def row_class(keys):
+    """It returns the `Row` class of the column names."""
+    return type('Row', (Row,), {
+        '__slots__': (),
+        '_keys': keys,
+        '_index': {key: i for i, key in enumerate(keys)},
+    })
+
+
+def _row_factory(stmt, as_record, dict_method):
+    # the column names are computed once per statement, not per row.
+    keys = tuple(column.name for column in _columns(stmt))
+    if as_record:
+        return row_class(keys)
+    return lambda row: dict_method(zip(keys, row))
+
+
+def _as_columns(stmt, rows, dict_method):
+    columns = _columns(stmt)
+    values = list(zip(*rows)) or [()] * len(columns)
+    return dict_method(
+        (column.name, _column_array(value, column.type))
+        for column, value in zip(columns, values)
+    )
+
+
+def _map_rows(factory, rows):
+    # a generator (not `map`) so that closing it closes the cursor of `rows` at once.
+    try:
+        for row in rows:
+            yield factory(row)
+    finally:
+        rows.close()
+
+
+def query_expression(stmt, conn=None, dialect=None, database=None,
+                     as_col_dict=True, as_row_list=True, dict_method=OrderedDict, debug={},
+                     chunk_size=STREAM_CHUNK_SIZE, as_columns=False, as_record=False, replica=True, prepared=True):
     """
     :stmt: sqlalchemy expression object
+    :database:
+      default: None,
+      the django database. if omitted, it is the database which the tables belong to (see `detect_database`).
+    :replica:
+      default: True,
+      if True (and `conn` is omitted), a read only statement runs on a replica of the database
+      configured by D2A_CONFIG['REPLICAS'] (see `d2a.replicas.ReplicaRouter`).
+      it runs on the database again if it failed on the replica.
+    :prepared:
+      default: True,
+      if True, the statement is prepared on the connection and executed with the parameters (PostgreSQL and MySQL)
+      while D2A_CONFIG['PREPARED_STATEMENTS'] is configured (see `d2a.prepared.PreparedStatements`).
+      streamed rows are not prepared.
     :as_col_dict:
       default: True,
+    :as_record:
+      default: False,
+      if True (and `as_col_dict` is True), each row is a `Row`, a tuple accessible by the column names
+      (``row['name']`` or ``row.name``). It is much lighter than `dict_method`.
+    :as_columns:
+      default: False,
+      if True, it returns a dict of column names to arrays of the values (it takes precedence over the above).
+      The arrays are typed NumPy arrays (see `NUMPY_DTYPES`) if numpy is installed, otherwise lists.
     :as_row_list:
       default: True,
+      if False, it returns a generator streaming rows through a server-side cursor
+      (an unbuffered cursor on MySQL). The cursor is closed when the generator is exhausted or closed.
+    :chunk_size:
+      default: D2A_CONFIG['STREAM_CHUNK_SIZE'] or 2000,
+      the number of rows fetched at once while streaming.
     :debug:
       default: {
         'show_sql': True, # if showing the sql query or not.
@@ -127,41 +600,426 @@ def query_expression(stmt, conn=None, dialect=None, database='default',
           %(prefix)s
         'printer': printer, # printing method. Try to use `logger.info` function for example.
         'delimiter': '=' * 100, # characters dividing debug informations.
-        'database': 'default' # django database
+        'database': the database of the statement # django database
       }
     """
+    primary = database = database or detect_database(stmt)
+    if replica and not conn:
+        database = replica_router.choose(primary, stmt)
+    timer = _make_timer(query_expression, 'query_expression', database)
     conn, dialect = _complement(conn, dialect, database)
-    binded = stmt.compile(dialect=dialect())
-    sql, params = DIALECT_MAPPING[dialect](str(binded), binded)
-    with conn.cursor() as cursor:
-        _execute_cursor(cursor, sql, params)
+    sql, params = _compile(stmt, dialect)
+    timer.lap('compile_time')
+    if not as_row_list and not as_columns:
+        if debug:
+            warnings.warn('`debug` is not supported while streaming rows.')
+        rows = _stream(conn, dialect, sql, params, chunk_size, timer)
+        if database != primary:
+            rows = replica_router.tracked(database, rows)
         if not as_col_dict:
-            result = list(cursor) if as_row_list else cursor
-        else:
-            dicts = (dict_method(zip([c.name for c in stmt.c], row))
-                     for row in cursor)
-            result = list(dicts) if as_row_list else dicts
+            return rows
+        return _map_rows(_row_factory(stmt, as_record, dict_method), rows)
 
-        if debug:
-            show_debug(cursor, sql, params, debug)
-        return result
+    try:
+        with replica_router.using(database), conn.cursor() as cursor:
+            executed = _execute_statement(conn, cursor, dialect, sql, params, prepared)
+            if executed or database == primary:
+                timer.lap('execute_time')
+                if as_columns:
+                    result = _as_columns(stmt, cursor.fetchall(), dict_method)
+                elif not as_col_dict:
+                    result = list(cursor)
+                else:
+                    result = list(map(_row_factory(stmt, as_record, dict_method), cursor))
+                timer.lap('fetch_time')
+                timer.send(sql, len(next(iter(result.values()), ())) if as_columns else len(result))
+                if plan_store is not None:
+                    plan_store.capture(cursor, dialect.name, sql, params, fingerprint(sql))
+
+                if debug:
+                    show_debug(cursor, sql, params, debug, database)
+                return result
+    except Exception as e:
+        timer.send(sql, None, e)
+        raise
+
+    # it failed on the replica, the statement runs on the primary (which sends its own signal).
+    replica_router.mark_down(database)
+    return query_expression(
+        stmt, dialect=dialect, database=primary, as_col_dict=as_col_dict, dict_method=dict_method,
+        debug=debug, as_columns=as_columns, as_record=as_record, replica=False, prepared=prepared,
+    )
 
 
-def execute_expression(stmt, conn=None, dialect=None, database='default', debug={}):
+def explain_expression(stmt, conn=None, dialect=None, database=None):
+    """It returns the plan of the statement in the structure of `d2a.plans.explain`
+    (PostgreSQL and MySQL only, otherwise ``None``).
+    """
+    database = database or detect_database(stmt)
     conn, dialect = _complement(conn, dialect, database)
-    binded = stmt.compile(dialect=dialect())
-    sql, params = DIALECT_MAPPING[dialect](str(binded), binded)
+    sql, params = _compile(stmt, dialect)
     with conn.cursor() as cursor:
-        _execute_cursor(cursor, sql, params)
-        if debug:
-            show_debug(cursor, sql, params, debug)
-        return cursor.rowcount
+        return explain(cursor, dialect.name, sql, params)
+
+
+def execute_expression(stmt, conn=None, dialect=None, database=None, debug={}, prepared=True):
+    """
+    :prepared:
+      default: True,
+      if True, the statement is prepared as `query_expression` does.
+    """
+    database = database or detect_database(stmt)
+    timer = _make_timer(execute_expression, 'execute_expression', database)
+    conn, dialect = _complement(conn, dialect, database)
+    sql, params = _compile(stmt, dialect)
+    timer.lap('compile_time')
+    try:
+        with conn.cursor() as cursor:
+            _execute_statement(conn, cursor, dialect, sql, params, prepared)
+            timer.lap('execute_time')
+            timer.send(sql, cursor.rowcount)
+            if debug:
+                show_debug(cursor, sql, params, debug, database)
+            return cursor.rowcount
+    except Exception as e:
+        timer.send(sql, None, e)
+        raise
+
+
+def _batches(rows, batch_size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _split_values(sql):
+    """It splits an insert statement into the sql and the template for `psycopg2.extras.execute_values`.
+    e.g. ``INSERT INTO t (a) VALUES (%(a)s) RETURNING t.id``
+    -> ``INSERT INTO t (a) VALUES %s RETURNING t.id``, ``(%(a)s)``
+    """
+    start = sql.find(' VALUES (')
+    if start < 0:
+        return None, None
+    start += len(' VALUES ')
+    depth = 0
+    for end in range(start, len(sql)):
+        if sql[end] == '(':
+            depth += 1
+        elif sql[end] == ')':
+            depth -= 1
+            if depth == 0:
+                return sql[:start] + '%s' + sql[end + 1:], sql[start:end + 1]
+    return None, None
+
+
+def _compile_many(stmt, dialect, column_keys):
+    # it does not render implicit `RETURNING` which is useless for executemany.
+    try:
+        return stmt.compile(dialect=_get_dialect_instance(dialect), column_keys=column_keys, for_executemany=True)
+    except TypeError:
+        # SQLAlchemy 1.3 or earlier
+        return stmt.compile(dialect=_get_dialect_instance(dialect), column_keys=column_keys, inline=True)
+
+
+def _supports_execute_values(stmt, dialect):
+    if dialect is not DIALECTS.get('postgresql') or not isinstance(stmt, Insert):
+        return False
+    try:
+        from psycopg2.extras import execute_values  # noqa
+    except ImportError:
+        return False
+    return True
+
+
+def execute_many(stmt, rows, conn=None, dialect=None, database=None, batch_size=EXECUTE_MANY_BATCH_SIZE):
+    """
+    :stmt: sqlalchemy expression object, for example ``insert(table)``.
+      it is compiled only once with the keys of the first row.
+    :rows: an iterable of dicts mapping parameter names (column names) to values.
+    :batch_size:
+      default: D2A_CONFIG['EXECUTE_MANY_BATCH_SIZE'] or 1000,
+      the number of rows sent at once. inserts on PostgreSQL are sent by `psycopg2.extras.execute_values`,
+      the others are sent by `cursor.executemany`.
+
+    It returns the total rowcount across batches. A failed batch raises the error and the rest are not sent,
+    the batches sent before it remain unless it runs in a transaction (`atomic`).
+    """
+    database = database or detect_database(stmt)
+    conn, dialect = _complement(conn, dialect, database)
+    batches = _batches(rows, batch_size)
+    first = next(batches, None)
+    if first is None:
+        return 0
+
+    binded = _compile_many(stmt, dialect, list(first[0]))
+    sql = SQL_MAPPING[dialect](str(binded))
+    params_mapping = PARAMS_MAPPING[dialect]
+    positiontup = getattr(binded, 'positiontup', None)
+    values_template = None
+    if _supports_execute_values(stmt, dialect):
+        values_sql, values_template = _split_values(sql)
+        if values_template is not None:
+            sql = values_sql
+
+    rowcount = 0
+    with conn.cursor() as cursor:
+        for batch in itertools.chain([first], batches):
+            params_list = [params_mapping(binded.construct_params(row), positiontup) for row in batch]
+            _execute_many_cursor(cursor, sql, params_list, values_template)
+            rowcount += max(cursor.rowcount, 0)
+    return rowcount
+
+
+def _quote_copy_value(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _array_literal(value, adapter):
+    return '{' + ','.join(
+        'NULL' if v is None else
+        _array_literal(v, adapter) if isinstance(v, (list, tuple)) else
+        _quote_copy_value(adapter(v))
+        for v in value
+    ) + '}'
+
+
+def _hstore_literal(value):
+    return ','.join(
+        '{}=>{}'.format(_quote_copy_value(k), 'NULL' if v is None else _quote_copy_value(v))
+        for k, v in value.items()
+    )
+
+
+_INTERVAL_TYPES = tuple(
+    getattr(sqltypes, name) for name in ['Interval', '_AbstractInterval'] if hasattr(sqltypes, name)
+)
+
+
+def _copy_adapter(type_):
+    """It returns a function converting a python value into the text representation of COPY."""
+    if isinstance(type_, sqltypes.Boolean):
+        return lambda v: 't' if v else 'f'
+    if isinstance(type_, sqltypes.ARRAY):
+        adapter = _copy_adapter(type_.item_type)
+        return lambda v: _array_literal(v, adapter)
+    if isinstance(type_, sqltypes.JSON):
+        return json.dumps
+    if isinstance(type_, HSTORE):
+        return _hstore_literal
+    if isinstance(type_, sqltypes._Binary):
+        return lambda v: '\\x' + bytes(v).hex()
+    if isinstance(type_, _INTERVAL_TYPES):
+        return lambda v: '{} days {} seconds {} microseconds'.format(v.days, v.seconds, v.microseconds)
+    return str
+
+
+def _csv_lines(columns, rows):
+    names = [c.name for c in columns]
+    adapters = [_copy_adapter(c.type) for c in columns]
+    for row in rows:
+        if isinstance(row, Mapping):
+            row = [row.get(name) for name in names]
+        # quoted empty strings are distinguished from NULL (unquoted empty)
+        yield ','.join(
+            '' if v is None else '"' + adapter(v).replace('"', '""') + '"'
+            for adapter, v in zip(adapters, row)
+        ) + '\n'
+
+
+class _IterReader(object):
+    """A file-like object that `copy_expert` reads chunks of an iterable from."""
+
+    def __init__(self, chunks, empty):
+        self._chunks = iter(chunks)
+        self._buffer = empty
+        self._empty = empty
+
+    def read(self, size=-1):
+        pieces = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            pieces.append(chunk)
+            length += len(chunk)
+        data = self._empty.join(pieces)
+        if size < 0:
+            size = length
+        data, self._buffer = data[:size], data[size:]
+        return data
+
+    readline = read
+
+
+class _QueueWriter(object):
+    """A file-like object that `copy_expert` writes into, it puts chunks of `buffer_size` into a queue."""
+
+    def __init__(self, chunks, buffer_size):
+        self.chunks = chunks
+        self.buffer_size = buffer_size
+        self.closed = False
+        self._pieces = []
+        self._length = 0
+
+    def write(self, data):
+        if self.closed:
+            raise IOError('The consumer of COPY stopped reading.')
+        self._pieces.append(data)
+        self._length += len(data)
+        if self._length >= self.buffer_size:
+            self.flush()
 
+    def flush(self):
+        if self._pieces:
+            self.chunks.put(self._pieces[0][:0].join(self._pieces))
+            self._pieces = []
+            self._length = 0
 
-def show_debug(cursor, sql, params, options={}):
+
+def _copy_options(format, header=False):
+    if format not in ('csv', 'binary'):
+        raise ValueError('format must be "csv" or "binary".')
+    options = ['FORMAT {}'.format(format)]
+    if header:
+        options.append('HEADER')
+    return ', '.join(options)
+
+
+def copy_into(table, rows, columns=None, conn=None, database=None, format='csv',
+              buffer_size=COPY_BUFFER_SIZE):
+    """It loads rows into the table by `COPY ... FROM STDIN` (PostgreSQL only).
+
+    :table: sqlalchemy table or the declared model (`declare`, `transfer`).
+    :rows:
+      an iterable of tuples in order of `columns` or dicts keyed by column names when `format` is "csv",
+      an iterable of bytes in the binary COPY format (e.g. produced by `copy_out`) when `format` is "binary".
+      rows are streamed, no list of them is built.
+    :columns: column names, default: all columns of the table.
+    :format: "csv" (default) or "binary".
+
+    It returns the number of copied rows, the error is raised if COPY failed (no rows are copied).
+    """
+    table = getattr(table, '__table__', table)
+    conn, dialect = _complement(conn, 'postgresql', database or detect_database(table))
+    columns = [table.c[name] for name in columns] if columns else list(table.c)
+    sql = 'COPY {} ({}) FROM STDIN WITH ({})'.format(
+        table.fullname,
+        ', '.join(c.name for c in columns),
+        _copy_options(format),
+    )
+    if format == 'csv':
+        reader = _IterReader(_csv_lines(columns, rows), '')
+    else:
+        reader = _IterReader(rows, b'')
+
+    with conn.cursor() as cursor:
+        try:
+            cursor.copy_expert(sql, reader, size=buffer_size)
+        except Exception:
+            logger.exception('sql:%s', sql)
+            raise
+        return max(cursor.rowcount, 0)
+
+
+def copy_out(stmt, conn=None, database=None, format='csv', header=False,
+             buffer_size=COPY_BUFFER_SIZE, queue_size=16):
+    """It streams the result of the statement by `COPY (...) TO STDOUT` (PostgreSQL only).
+
+    :stmt: sqlalchemy expression object or table (every row is copied).
+    :format: "csv" (default) or "binary". binary chunks can be passed to `copy_into` as they are.
+    :header: if outputting the header line or not (csv only).
+    :queue_size: the number of chunks buffered while the consumer is busy.
+
+    It returns a generator of bytes chunks. COPY runs on a background thread over a new connection
+    from the first iteration until the generator is exhausted or closed, the connection is free meanwhile.
+    Within a transaction (`atomic`) it runs on the connection of the transaction instead,
+    which sees the rows written in it, and the whole result is copied at the first iteration.
+    """
+    stmt = getattr(stmt, '__table__', stmt)
+    conn, dialect = _complement(conn, 'postgresql', database or detect_database(stmt))
+    if isinstance(stmt, Table):
+        stmt = stmt.select()
+    sql, params = _compile(stmt, dialect)
+    return _copy_out(conn, sql, params, _copy_options(format, header), buffer_size, queue_size)
+
+
+def _copy_out(conn, sql, params, options, buffer_size, queue_size):
+    with conn.cursor() as cursor:
+        query = cursor.mogrify(sql, params)
+    if isinstance(query, bytes):
+        query = query.decode(conn.connection.encoding)
+    copy_sql = 'COPY ({}) TO STDOUT WITH ({})'.format(query, options)
+
+    if conn.in_atomic_block:
+        # another connection does not see the rows written in the transaction,
+        # the result is copied at once on the connection of the transaction.
+        chunks = queue.Queue()
+        writer = _QueueWriter(chunks, buffer_size)
+        with conn.cursor() as cursor:
+            try:
+                cursor.cursor.copy_expert(copy_sql, writer, size=buffer_size)
+            except Exception:
+                logger.exception('sql:%s', copy_sql)
+                raise
+        writer.flush()
+        while not chunks.empty():
+            chunk = chunks.get()
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+        return
+
+    # the caller keeps using its connection while the background thread copies over its own one.
+    raw = conn.get_new_connection(conn.get_connection_params())
+    raw.autocommit = True
+    cursor = raw.cursor()
+    chunks = queue.Queue(maxsize=queue_size)
+    writer = _QueueWriter(chunks, buffer_size)
+    done = object()
+    errors = []
+
+    def run():
+        try:
+            cursor.execute('SET TIME ZONE %s', [conn.timezone_name])
+            cursor.copy_expert(copy_sql, writer, size=buffer_size)
+            writer.flush()
+        except Exception as e:
+            # it is silent only if the consumer closed the generator, otherwise the consumer raises it.
+            if not writer.closed:
+                logger.exception('sql:%s', copy_sql)
+                errors.append(e)
+        finally:
+            chunks.put(done)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is done:
+                if errors:
+                    raise errors[0]
+                break
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+    finally:
+        writer.closed = True
+        while thread.is_alive():
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        thread.join()
+        cursor.close()
+        raw.close()
+
+
+def show_debug(cursor, sql, params, options={}, database=DEFAULT_DB_ALIAS):
     printer = options.get('printer', print)
     delimiter = options.get('delimiter', '=' * 100 + '\n')
-    database = _detect_db_type(options.get('database', 'default'))
+    database = _detect_db_type(options.get('database', database))
     if options.get('show_sql', True):
         show_sql(cursor, printer, delimiter, database,
                  options.get('sql_format', False),
@@ -202,20 +1060,136 @@ def show_explain(cursor, printer, delimiter, database, sql, params, explain_pref
     printer(delimiter + sql)
 
 
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+# `create_engine` arguments to the arguments of the pool classes which accept them (e.g. `QueuePool`).
+POOL_ARGUMENTS = {
+    'pool_size': 'pool_size',
+    'max_overflow': 'max_overflow',
+    'pool_timeout': 'timeout',
+    'pool_use_lifo': 'use_lifo',
+}
+
+
+def _pool_arguments(poolclass):
+    arguments = set()
+    for cls in inspect.getmro(poolclass):
+        if issubclass(cls, Pool):
+            arguments.update(inspect.signature(cls.__init__).parameters)
+    return arguments
+
+
+def _engine_options(uri, options):
+    """It drops the pool options of D2A_CONFIG['ENGINE_OPTIONS'] which the pool class of the engine does not accept,
+    for example `max_overflow` for SQLite (`SingletonThreadPool`, `NullPool`) or `StaticPool`.
+    """
+    poolclass = options.get('poolclass')
+    if poolclass is None:
+        url = make_url(uri)
+        poolclass = url.get_dialect().get_pool_class(url)
+    arguments = _pool_arguments(poolclass)
+    return {
+        k: v for k, v in ENGINE_OPTIONS.items()
+        if k not in POOL_ARGUMENTS or POOL_ARGUMENTS[k] in arguments
+    }
+
+
 def make_engine(db_type=None, database='default', **options):
-    uri = URI[db_type or _detect_db_type(database)]
-    return create_engine(uri.format(**settings.DATABASES[database]), **options)
+    """It returns an engine of the django database.
+    The engine (and its connection pool) is shared by the calls with the same database and options.
+
+    :param str db_type: Database type, for example `postgresql`.
+      If omitted this option, it will be detected from django settings.
+    :param str database: The django database.
+    :param options: Keyword arguments of `create_engine`, they take precedence over D2A_CONFIG['ENGINE_OPTIONS'].
+      The pool options of D2A_CONFIG['ENGINE_OPTIONS'] are applied only to the pool classes which accept them.
+    """
+    uri = URI[db_type or _detect_db_type(database)].format(**settings.DATABASES[database])
+    options = dict(_engine_options(uri, options), **options)
+    key = (database, uri, repr(sorted(options.items())))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = create_engine(uri, **options)
+            _instrument_engine(engine, database)
+    return engine
+
+
+def _instrument_engine(engine, database):
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('d2a_timers', []).append(_make_timer(engine, 'engine', database))
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        timer = conn.info['d2a_timers'].pop()
+        timer.lap('execute_time')
+        timer.send(statement, cursor.rowcount)
+
+    @event.listens_for(engine, 'handle_error')
+    def handle_error(context):
+        timers = context.connection is not None and context.connection.info.get('d2a_timers')
+        if timers:
+            timer = timers.pop()
+            timer.lap('execute_time')
+            timer.send(context.statement, None, context.original_exception)
+
+
+def reset_engines(close=False):
+    """It replaces the connection pools of the shared engines with new ones.
+
+    :param bool close: Whether closing the pooled connections or not.
+      It must be false in a forked process because the connections belong to the parent process,
+      it is done automatically after `os.fork` (Python 3.7 or later),
+      otherwise call it from a hook such as gunicorn's `post_fork`.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            if close:
+                engine.dispose()
+            else:
+                # the same as `engine.dispose(close=False)` of SQLAlchemy 1.4.33 or later.
+                engine.pool = engine.pool.recreate()
+
+
+def _after_fork():
+    global _engines_lock
+    # the lock may have been held by another thread of the parent process.
+    _engines_lock = threading.Lock()
+    reset_engines()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class RoutingSession(Session):
+    """A session which runs the statements on the shared engines (`make_engine`) of the databases
+    which the tables belong to (see `detect_database`).
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if kwargs.get('bind') is not None:
+            return kwargs['bind']
+        table = getattr(mapper, 'local_table', None)
+        if table is not None:
+            return make_engine(database=detect_database(table))
+        if clause is not None:
+            return make_engine(database=detect_database(clause))
+        return make_engine()
 
 
 @contextmanager
 def make_session(engine=None,
                  autoflush=True, autocommit=False,
                  expire_on_commit=True, info=None):
-    engine = engine or make_engine()
-    Session = sessionmaker(engine,
+    # without the engine, each model is bound to the shared engine of its database.
+    factory = sessionmaker(engine, class_=Session if engine else RoutingSession,
                            autoflush=autoflush, autocommit=autocommit,
                            expire_on_commit=expire_on_commit, info=info)
-    session = Session()
+    session = factory()
     try:
         yield session
     except Exception:
@@ -1,5 +1,7 @@
 # coding: utf-8
+import inspect
 import warnings
+from collections import namedtuple
 
 from django.db import models
 from django.conf import settings
@@ -14,6 +16,7 @@ from sqlalchemy.dialects import (
 )
 
 from .compat import M2MField
+from .missing import fallback
 from .original_types import CIText
 
 """
@@ -40,13 +43,45 @@ Mapping definition
 """
 
 
+DB_TYPES = ['postgresql', 'mysql', 'oracle', 'sqlite3', 'firebird', 'mssql', 'default']
+
+ColumnType = namedtuple('ColumnType', ['type', 'kwargs'])
+
+
 def alias(new_field, existing_field):
     """It defines a new converting rule same with existing one.
 
     :param django.db.models.fields.Field new_field: A field which you want to add.
     :param django.db.models.fields.Field existing_field: A field copied from.
     """
+    from .schema import clear_schemas
     mapping[new_field] = mapping[existing_field]
+    resolved.clear()
+    compile_mapping()
+    clear_schemas()
+
+
+def resolve(field):
+    """It returns the converting rule of the field.
+    Unregistered field types are resolved by the nearest registered ancestor, otherwise by `MISSING` setting.
+    Results are cached per field type in `resolved`, `alias` clears it.
+
+    :param django.db.models.fields.Field field: A field (instance).
+    """
+    field_type = type(field)
+    try:
+        return resolved[field_type]
+    except KeyError:
+        pass
+
+    for cls in inspect.getmro(field_type):
+        if cls in mapping:
+            conf = mapping[cls]
+            break
+    else:
+        conf = mapping.get(fallback(field, KeyError(field_type)), {})
+    resolved[field_type] = conf
+    return conf
 
 
 def alias_dict(extra_mapping={}):
@@ -54,8 +89,62 @@ def alias_dict(extra_mapping={}):
         alias(new_field, existing_field)
 
 
+def _type_factory(conf, db_type):
+    """It compiles the converting rule into a function which receives a field
+    and returns `ColumnType` for the database type, or ``None`` if the rule has no type.
+    """
+    type_key, kwargs_key = '__{}_type__'.format(db_type), '__{}_type_kwargs__'.format(db_type)
+
+    def pick(info):
+        if info.get(type_key) is not None:
+            return ColumnType(info[type_key], info.get(kwargs_key, {}))
+        if info.get('__default_type__') is not None:
+            return ColumnType(info['__default_type__'], info.get('__default_type_kwargs__', {}))
+        return None
+
+    if '__callback__' not in conf:
+        column_type = pick(conf)
+        return lambda field: column_type
+
+    def factory(field):
+        # the same as `parse_field`, a callback may replace the field (e.g. the target field of a foreign key).
+        info = dict(conf)
+        while '__callback__' in info:
+            result = info.pop('__callback__')(field)
+            if isinstance(result, tuple):
+                result, field = result
+            info.update(result)
+        return pick(info)
+    return factory
+
+
+def compile_mapping():
+    """It compiles `mapping` into `type_tables`, `alias` calls it again."""
+    for db_type in DB_TYPES:
+        type_tables[db_type] = {field_type: _type_factory(conf, db_type) for field_type, conf in mapping.items()}
+
+
+def resolve_type(field, db_type):
+    """It returns `ColumnType` of the field for the database type, or ``None`` if the field has no column.
+    Database types without their own type have the `default` one, so do unknown database types.
+
+    :param django.db.models.fields.Field field: A field (instance).
+    :param str db_type: Database type, for example `postgresql`.
+    """
+    table = type_tables.get(db_type) or type_tables['default']
+    try:
+        factory = table[type(field)]
+    except KeyError:
+        # subclasses and missing fields are compiled on the first time.
+        factory = table[type(field)] = _type_factory(resolve(field), db_type)
+    return factory(field)
+
+
 D2A_CONFIG = getattr(settings, 'D2A_CONFIG', {})
 
+resolved = {}
+# database types to field types to the compiled rules (see `resolve_type`).
+type_tables = {}
 mapping = {
     models.AutoField: {
         '__default_type__': default_types.INTEGER,
@@ -277,7 +366,7 @@ mapping = {
     },
     models.ForeignKey: {
         '__callback__': lambda f: {
-            '__callback__': lambda f: (mapping[type(f.target_field)], f.target_field),
+            '__callback__': lambda f: (resolve(f.target_field), f.target_field),
             '__rel_kwargs__': {
                 '__logical_name__': f.name,
                 '__back__': f.related_query_name().rstrip('+').lower(),
@@ -296,7 +385,7 @@ mapping = {
     },
     models.OneToOneField: {
         '__callback__': lambda f: {
-            '__callback__': lambda f: (mapping[type(f.target_field)], f.target_field),
+            '__callback__': lambda f: (resolve(f.target_field), f.target_field),
             '__rel_kwargs__': {
                 '__logical_name__': f.name,
                 '__back__': f.related_query_name().rstrip('+').lower(),
@@ -412,7 +501,8 @@ try:
         while isinstance(field, postgres_fields.ArrayField):
             field = field.base_field
             dimensions += 1
-        return {"item_type": mapping[type(field)].get(f"__{db_type}_type__"), "dimensions": dimensions}
+        item_type = resolve_type(field, db_type)
+        return {"item_type": item_type and item_type.type, "dimensions": dimensions}
 
     mapping[postgres_fields.ArrayField] = {
         '__default_type__': postgresql_types.ARRAY,
@@ -544,3 +634,5 @@ try:
 except (ImportError, AttributeError, ImproperlyConfigured) as e:
     if D2A_CONFIG.get('USE_GEOALCHEMY2', False):
         warnings.warn('An error occured: {}. HINT: GeoAlchemy2 should be installed when you use GeoDjango.'.format(e))
+
+compile_mapping()
@@ -1,12 +1,19 @@
 
+import hashlib
 import importlib
 import inspect
+import json
 import logging
+import os
 import sys
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
+import django
+from django.apps import apps
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db.models.fields import NOT_PROVIDED
 from django.template import Context, Template
 from django.template.loader import get_template
@@ -16,11 +23,13 @@ from sqlalchemy.sql.sqltypes import TypeEngine
 
 from d2a import (
     D2A_CONFIG, AUTO_DETECTED_DB_TYPE, NAME_FORMATTER,
-    declare, parse_models, parse_model, DB_TYPES,
-    _extract_kwargs,
+    declare, parse_models, schemas,
+    _extract_kwargs, _loading, _relationship_kinds,
 )
-from d2a.resolvers import reverse_mapping
-from d2a.template import TEMPLATE
+from d2a.cache import config_key
+from d2a.resolvers import resolve
+from d2a.template import HEADER_TEMPLATE, MODEL_TEMPLATE, FOOTER_TEMPLATE
+from d2a.utils import stable_repr
 
 REL_PARAMS = D2A_CONFIG.get("REL_PARAMS", {})
 COL_PARAMS = D2A_CONFIG.get("COL_PARAMS", {})
@@ -36,75 +45,267 @@ class Command(BaseCommand):
         parser.add_argument("--path", type=str, required=False, default="./models_sqla.py", help="generated file path")
         parser.add_argument("--template-path", type=str, required=False, help="template file path")
         parser.add_argument("--db-type", type=str, required=False, default=AUTO_DETECTED_DB_TYPE, help="db_type: Database type, for example `postgresql`. If omitted this option, it will be detected from django settings.")
+        parser.add_argument("--incremental", action="store_true",
+                            help="rebuilds and renders only models changed since the previous run, "
+                                 "the others are taken from the state file. "
+                                 "A template given by --template-path is rendered as a whole.")
+        parser.add_argument("--state-path", type=str, required=False,
+                            help="state file path for --incremental. default: `{path}.d2a.json`")
+        parser.add_argument("--per-app", action="store_true",
+                            help="generates a file per app. --path is formatted with `app` (models module name) "
+                                 "and `app_dir`, for example `{app_dir}/models_sqla.py`.")
+        parser.add_argument("--jobs", type=int, required=False, default=1,
+                            help="number of processes generating files in parallel with --per-app.")
         super().add_arguments(parser)
 
         return parser
 
     def handle(self, *args, **options):
-        models = OrderedDict()
-        for app in settings.INSTALLED_APPS:
-            mods = app.split('.')
-            for i in range(1, len(mods) + 1):
-                mod = '.'.join(mods[:i])
-                d = f'{mod}.models'
-                try:
-                    django_models = importlib.import_module(d)
-                    for model in parse_models(django_models).values():
-                        build_context(model, models, db_type=options["db_type"])
-                except ImportError:
-                    pass
-        
-        if options.get("template_path"):
-            t = get_template(options["template_path"]).template
+        db_type = options["db_type"]
+        template_path = options.get("template_path")
+        command = " ".join(sys.argv)
+        app_models = collect_models()
+
+        state_path = options.get("state_path") or options["path"].format(app="all", app_dir=".") + ".d2a.json"
+        config_key = make_config_key(db_type, template_path)
+        previous = load_state(state_path, config_key) if options.get("incremental") else {}
+
+        if not options.get("per_app"):
+            django_models = [model for models in app_models.values() for model in models]
+            models, state, _ = build_contexts(django_models, db_type, previous, template_path)
+            render(models, options["path"], template_path, command)
         else:
-            t = Template(TEMPLATE)
-        with open(options["path"], "w") as f:
-            context = Context({
-                "generated_at": timezone.now().strftime('%c %Z'),
-                "command": " ".join(sys.argv),
-                "models": models.values(),
-                "blocks": BLOCKS,
-            })
-            f.write(t.render(context))
+            if "{" not in options["path"]:
+                raise CommandError("--path must contain `{app}` or `{app_dir}` with --per-app.")
+            tasks = []
+            for mod, django_models in app_models.items():
+                app = mod.rsplit(".", 1)[0]
+                app_config = apps.get_containing_app_config(mod)
+                app_dir = os.path.dirname(importlib.import_module(app).__file__)
+                path = options["path"].format(app=app, app_dir=app_dir)
+                # models imported from other apps are generated in their own files.
+                labels = [
+                    model._meta.label for model in django_models
+                    if app_config is None or model._meta.app_label == app_config.label
+                ]
+                tasks.append((labels, path, db_type, template_path, command, previous))
+
+            state = OrderedDict()
+            if options["jobs"] > 1:
+                with ProcessPoolExecutor(max_workers=options["jobs"]) as executor:
+                    results = list(executor.map(generate_app, tasks))
+            else:
+                results = [generate_app(task) for task in tasks]
+            for app_state in results:
+                state.update(app_state)
+
+        # the state is not written again if nothing has changed.
+        if options.get("incremental") and state != previous:
+            save_state(state_path, config_key, state)
+
+
+def collect_models():
+    """It returns django models grouped by models modules of `INSTALLED_APPS`."""
+    app_models = OrderedDict()
+    for app in settings.INSTALLED_APPS:
+        mods = app.split('.')
+        for i in range(1, len(mods) + 1):
+            mod = '.'.join(mods[:i])
+            d = f'{mod}.models'
+            try:
+                django_models = importlib.import_module(d)
+            except ImportError:
+                continue
+            app_models[d] = list(parse_models(django_models).values())
+    return app_models
+
+
+def generate_app(task):
+    """It generates a file of the models of an app, it runs in a worker process with --jobs."""
+    # a spawned worker has not set up django yet (`initializer` of the pool needs python 3.7).
+    if not apps.ready:
+        django.setup()
+    labels, path, db_type, template_path, command, previous = task
+    django_models = [apps.get_model(label) for label in labels]
+    models, state, changed = build_contexts(django_models, db_type, previous, template_path)
+    for entry in state.values():
+        entry["path"] = path
+
+    removed = any(entry.get("path") == path and label not in state for label, entry in previous.items())
+    if changed or removed or not os.path.exists(path):
+        render(models, path, template_path, command)
+    return state
+
+
+def render(models, path, template_path, command):
+    context = Context({
+        "generated_at": timezone.now().strftime('%c %Z'),
+        "command": command,
+        "models": models.values(),
+        "blocks": BLOCKS,
+    })
+    with open(path, "w") as f:
+        if template_path:
+            f.write(get_template(template_path).template.render(context))
+            return
+        # the models are rendered by `build_contexts`.
+        f.write(_template(HEADER_TEMPLATE).render(context))
+        f.writelines(model_context["code"] for model_context in models.values())
+        f.write(_template(FOOTER_TEMPLATE).render(context))
+
+
+@lru_cache(maxsize=None)
+def _template(source):
+    return Template(source)
+
+
+def render_model(model_context):
+    """It returns the code of the model rendered by `MODEL_TEMPLATE` of the default template."""
+    return _template(MODEL_TEMPLATE).render(Context({"model": model_context, "blocks": BLOCKS}))
+
+
+def fingerprint(django_model, db_type):
+    """It returns the hash of the definitions of the model which its context depends on."""
+    meta = django_model._meta
+    parts = [meta.label, meta.db_table, NAME_FORMATTER(meta.object_name), db_type]
+    for field in meta.fields + meta.many_to_many:
+        parts += [field.column, field.deconstruct()]
+        if field.is_relation and field.related_model is not None:
+            related_meta = field.related_model._meta
+            parts += [related_meta.label, related_meta.db_table, related_meta.pk.column]
+        if field.many_to_one or field.one_to_one:
+            # the type of the foreign key column is resolved from the target field.
+            parts += [field.target_field.column, type(field.target_field), field.target_field.deconstruct()]
+        if field.many_to_many:
+            parts += [
+                field.remote_field.through._meta.db_table,
+                field.m2m_column_name(),
+                field.m2m_reverse_name(),
+            ]
+    return hashlib.sha1(stable_repr(parts).encode()).hexdigest()
+
+
+def make_config_key(db_type, template_path):
+    """It returns the hash of settings and sources which affect all the models."""
+    key = config_key(
+        db_type, template_path, REL_PARAMS, COL_PARAMS, TYPE_PARAMS, TYPES, BLOCKS, NAME_FORMATTER,
+        modules=['d2a.resolvers', 'd2a.template', __name__],
+    )
+    if not template_path:
+        return key
+    digest = hashlib.sha1(key.encode())
+    digest.update(get_template(template_path).template.source.encode())
+    return digest.hexdigest()
+
+
+def _dump_context(model_context):
+    return {**model_context, "django_model": model_context["django_model"]._meta.label}
+
+
+def _load_context(model_context):
+    return {
+        **model_context,
+        "django_model": apps.get_model(model_context["django_model"]),
+        "columns": OrderedDict(model_context["columns"]),
+        "relationships": OrderedDict(model_context["relationships"]),
+    }
+
+
+def load_state(path, config_key):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+    if state.get("config_key") != config_key:
+        return {}
+    return state["models"]
+
+
+def save_state(path, config_key, models):
+    with open(path, "w") as f:
+        json.dump({"config_key": config_key, "models": models}, f, indent=1)
+
+
+def build_contexts(django_models, db_type, previous={}, template_path=None):
+    """It builds contexts of the models, contexts of models whose fingerprints are unchanged are taken from `previous`.
+    The models are also rendered unless `template_path` is given (see `render`).
+    It returns the contexts, the state for the next run and whether any model was rebuilt.
+    """
+    models = OrderedDict()
+    state = OrderedDict()
+    changed = False
+
+    def add(model_context, key, secondaries=()):
+        if not template_path and "code" not in model_context:
+            model_context["code"] = render_model(model_context)
+        models[model_context["model_name"]] = model_context
+        state[model_context["django_model"]._meta.label] = {
+            "fingerprint": key, "context": _dump_context(model_context), "secondaries": list(secondaries),
+        }
+
+    def take(django_model):
+        nonlocal changed
+        label = django_model._meta.label
+        if label in state:
+            return
+        key = fingerprint(django_model, db_type)
+        entry = previous.get(label)
+        if entry and entry["fingerprint"] == key:
+            # the intermediate models have their own entries, which may have been changed.
+            for secondary in entry["secondaries"]:
+                take(apps.get_model(secondary))
+            add(_load_context(entry["context"]), key, entry["secondaries"])
+            return
+
+        built = OrderedDict()
+        build_context(django_model, built, db_type)
+        changed = True
+        model_context = built.pop(NAME_FORMATTER(django_model._meta.object_name))
+        for secondary_context in built.values():
+            add(secondary_context, fingerprint(secondary_context["django_model"], db_type))
+        add(model_context, key, [c["django_model"]._meta.label for c in built.values()])
+
+    for django_model in django_models:
+        take(django_model)
+    return models, state, changed
 
 
 def build_context(django_model, models, db_type):
-    model_info = parse_model(django_model)
+    schema = schemas.get(django_model)
     model_name = NAME_FORMATTER(django_model._meta.object_name)
     model_context = {
         "django_model": django_model,
-        "table_name": model_info['table_name'],
+        "table_name": schema.table_name,
         "model_name": model_name,
         "columns": OrderedDict(),
         "relationships": OrderedDict(),
     }
 
     rel_kwargs_map = OrderedDict()
-    for name, kwargs in model_info['fields'].items():
-        types = {t: kwargs.get(f'__{t}_type__', None) for t in DB_TYPES}
-        type_kwargs = {t: kwargs.get(f'__{t}_type_kwargs__', {}) for t in DB_TYPES}
-        type_key = 'default' if types.get(db_type) is None else db_type
-        rel_kwargs = kwargs.get('__rel_kwargs__', {})
-        if rel_kwargs:
-            rel_kwargs_map[name] = rel_kwargs
-        
-        if not types[type_key]:
+    for name, field in schema.fields.items():
+        if field.rel_kwargs:
+            rel_kwargs_map[name] = field.rel_kwargs
+
+        column_type = field.column_type(db_type)
+        if not column_type:
             continue
 
-        field_type = TYPES.get("*") or TYPES.get(f"{model_name}.{name}") or reverse_mapping[types[type_key]]
+        field_type = TYPES.get("*") or TYPES.get(f"{model_name}.{name}") or resolve(column_type.type)
         type_kwargs_extended = {**TYPE_PARAMS.get("*", {}), **TYPE_PARAMS.get(f"{model_name}.{name}", {})}
-        type_args = render_args({**type_kwargs[type_key], **type_kwargs_extended})
+        type_args = render_args({**column_type.kwargs, **type_kwargs_extended})
         model_context["columns"][name] = [f"{field_type}({', '.join(type_args)})"]
-        if '__fk_kwargs__' in kwargs:
-            fk_args = render_args(kwargs['__fk_kwargs__'])
+        if field.fk_kwargs is not None:
+            fk_args = render_args(field.fk_kwargs)
             model_context["columns"][name] += [f"sa.ForeignKey({', '.join(fk_args)})"]
-        
+
+        kwargs = dict(field.column_kwargs)
         kwargs_extended = {**COL_PARAMS.get("*", {}), **COL_PARAMS.get(f"{model_name}.{name}", {})}
         if "default" in kwargs:
             del kwargs["default"]
-            logical_name = kwargs.get("__logical_name__")
-            if "default" not in kwargs_extended and logical_name is not None:
-                model_context["columns"][name] += [f"default=GET_DEFAULT('{django_model.__module__}.{model_name}.{logical_name}')"]
+            if "default" not in kwargs_extended and field.logical_name is not None:
+                default_path = f"{django_model.__module__}.{model_name}.{field.logical_name}"
+                model_context["columns"][name] += [f"default=GET_DEFAULT('{default_path}')"]
 
         model_context["columns"][name] += render_args({**kwargs, **kwargs_extended})
 
@@ -113,6 +314,17 @@ def build_context(django_model, models, db_type):
             name = rel_kwargs['__logical_name__']
         
         rel_kwargs_extended = {**REL_PARAMS.get("*", {}), **REL_PARAMS.get(f"{model_name}.{name}", {})}
+        # the same loading strategies as `declare`.
+        kind, back_kind = _relationship_kinds(rel_kwargs)
+        lazy = _loading(django_model, name, kind)
+        if lazy:
+            rel_kwargs_extended["lazy"] = lazy
+        back = rel_kwargs_extended.get("backref")
+        if isinstance(back, str):
+            back = back.format(**rel_kwargs)
+            back_lazy = _loading(rel_kwargs['__related_model__'], back, back_kind)
+            if back_lazy:
+                rel_kwargs_extended["backref"] = Code(f'sa.orm.backref("{back}", lazy="{back_lazy}")')
         model_context["relationships"][name] = [
             f"'{rel_kwargs['__related_model__']._meta.object_name}'",
             *render_args({**rel_kwargs, **rel_kwargs_extended}, rel_kwargs),
@@ -123,12 +335,18 @@ def build_context(django_model, models, db_type):
     models[model_name] = model_context
 
 
+class Code(str):
+    """A string rendered as it is, not as a string literal."""
+
+
 def render_args(kwargs: dict, context: dict={}):
     args = []
     for k, v in _extract_kwargs(kwargs).items():
-        if isinstance(v, str):
+        if isinstance(v, Code):
+            pass
+        elif isinstance(v, str):
             v = f'"{v}"'.format(**context)
         elif inspect.isclass(v) and issubclass(v, TypeEngine):
-            v = reverse_mapping[v]
+            v = resolve(v)
         args += [f"{k}={v}"]
     return args
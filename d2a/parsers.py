@@ -8,9 +8,8 @@ from django.db.models.base import ModelBase
 from django.db.models.fields import NOT_PROVIDED
 from django.db import models
 
-from .fields import mapping
+from .fields import resolve
 from .compat import M2MField
-from .missing import fallback
 
 logger = logging.getLogger(__name__)
 
@@ -24,7 +23,6 @@ def get_m2m_fields(model):
 
 def parse_field(field):
     info = {}
-    field_type = type(field)
 
     for django_attr, alchemy_attr in [
         ('primary_key', 'primary_key'), 
@@ -37,13 +35,7 @@ def parse_field(field):
     if getattr(field, 'default', NOT_PROVIDED) is not NOT_PROVIDED:
         info['default'] = field.default
 
-    try:
-        conf = mapping[field_type]
-    except KeyError as e:
-        alt = fallback(field, e)
-        conf = mapping.get(alt, {})
-    
-    info.update(conf)
+    info.update(resolve(field))
     while '__callback__' in info:
         result = info.pop('__callback__')(field)
         if isinstance(result, tuple):
@@ -0,0 +1,218 @@
+# coding: utf-8
+import os
+import json
+import atexit
+import logging
+import threading
+import warnings
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_JSON_PREFIXES = {
+    'postgresql': 'EXPLAIN (FORMAT JSON, VERBOSE)',
+    'mysql': 'EXPLAIN FORMAT=JSON',
+}
+
+
+class PlanWarning(UserWarning):
+    """It is warned when a plan is flagged.
+    Test runs can turn it into an error by ``-W error::d2a.plans.PlanWarning``.
+    """
+
+
+def _walk_postgresql(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _walk_postgresql(child)
+
+
+def _walk_mysql(obj):
+    if isinstance(obj, dict):
+        if 'table_name' in obj:
+            yield obj
+        for value in obj.values():
+            yield from _walk_mysql(value)
+    elif isinstance(obj, list):
+        for value in obj:
+            yield from _walk_mysql(value)
+
+
+def _table_rows_postgresql(cursor, schema, relation):
+    # `reltuples` is -1 (or 0 on older versions) until the table is analyzed.
+    cursor.execute(
+        'SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)',
+        ['"{}"."{}"'.format(schema, relation) if schema else '"{}"'.format(relation)],
+    )
+    row = cursor.fetchone()
+    return max(int(row[0]), 0) if row else 0
+
+
+def _parse_postgresql(cursor, raw):
+    root = raw[0]['Plan']
+    nodes = []
+    for node in _walk_postgresql(root):
+        seq_scan = node['Node Type'] == 'Seq Scan'
+        rows = node.get('Plan Rows')
+        if seq_scan:
+            rows = max(rows or 0, _table_rows_postgresql(cursor, node.get('Schema'), node['Relation Name']))
+        nodes.append({
+            'node_type': node['Node Type'],
+            'relation': node.get('Relation Name'),
+            'rows': rows,
+            'cost': node.get('Total Cost'),
+            'seq_scan': seq_scan,
+        })
+    return {'cost': root['Total Cost'], 'nodes': nodes}
+
+
+def _parse_mysql(cursor, raw):
+    block = raw['query_block']
+    nodes = [{
+        'node_type': table.get('access_type'),
+        'relation': table['table_name'],
+        'rows': table.get('rows_examined_per_scan'),
+        'cost': float(table.get('cost_info', {}).get('read_cost', 0)),
+        'seq_scan': table.get('access_type') == 'ALL',
+    } for table in _walk_mysql(block)]
+    return {'cost': float(block.get('cost_info', {}).get('query_cost', 0)), 'nodes': nodes}
+
+
+PARSE_MAPPING = {
+    'postgresql': _parse_postgresql,
+    'mysql': _parse_mysql,
+}
+
+
+def explain(cursor, db_type, sql, params):
+    """It runs EXPLAIN in JSON format and returns the plan as follows,
+    or ``None`` if the database type is not supported or the EXPLAIN failed.
+
+    ``{'cost': 12.5, 'nodes': [
+        {'node_type': 'Seq Scan', 'relation': 'books_author', 'rows': 100, 'cost': 12.5, 'seq_scan': True},
+    ]}``
+
+    The `rows` of a sequential scan is the number of rows of the table.
+    """
+    if db_type not in EXPLAIN_JSON_PREFIXES:
+        return None
+    try:
+        cursor.execute('{} {}'.format(EXPLAIN_JSON_PREFIXES[db_type], sql), params)
+        raw = cursor.fetchone()[0]
+        if isinstance(raw, (bytes, str)):
+            raw = json.loads(raw)
+        return PARSE_MAPPING[db_type](cursor, raw)
+    except Exception:
+        logger.exception('The plan could not be captured.\nparam:%s\nsql:%s', params, sql)
+        return None
+
+
+def check_plan(plan, baseline=None, seq_scan_rows=10000, cost_tolerance=0.2):
+    """It returns the problems of the plan as a list of dicts, empty if nothing is found.
+
+    :param dict plan: A plan returned by `explain`.
+    :param dict baseline: A plan compared with.
+    :param int seq_scan_rows: Sequential scans on tables having this number of rows or more are flagged.
+    :param float cost_tolerance: The plan costing more than the baseline by this ratio is flagged.
+    """
+    flags = [
+        {'type': 'seq_scan', 'relation': node['relation'], 'rows': node['rows']}
+        for node in plan['nodes']
+        if node['seq_scan'] and (node['rows'] or 0) >= seq_scan_rows
+    ]
+    if baseline and plan['cost'] > baseline['cost'] * (1 + cost_tolerance):
+        flags.append({'type': 'cost_increase', 'baseline': baseline['cost'], 'cost': plan['cost']})
+    return flags
+
+
+def _describe(flag):
+    if flag['type'] == 'seq_scan':
+        return 'a sequential scan on {relation} ({rows} rows)'.format(**flag)
+    return 'the cost increased from {baseline} to {cost}'.format(**flag)
+
+
+class PlanStore(object):
+    """A JSON file of plans per statement fingerprint.
+    The first plan of each statement is kept as the baseline which later plans are compared with.
+
+    :param str path: The store file path.
+    :param int seq_scan_rows: See `check_plan`.
+    :param float cost_tolerance: See `check_plan`.
+    :param bool update: Whether replacing the baselines with new plans or not.
+    """
+
+    def __init__(self, path, seq_scan_rows=10000, cost_tolerance=0.2, update=False):
+        self.path = path
+        self.seq_scan_rows = seq_scan_rows
+        self.cost_tolerance = cost_tolerance
+        self.update = update
+        self._entries = None
+        self._dirty = False
+        self._registered = False
+        self._lock = threading.RLock()
+
+    def load(self):
+        with self._lock:
+            if self._entries is not None:
+                return
+            self._entries = {}
+            try:
+                with open(self.path) as f:
+                    self._entries = json.load(f)
+            except (IOError, OSError):
+                pass
+            except ValueError:
+                logger.warning('The plan store %s is broken, it will be rebuilt.', self.path, exc_info=True)
+
+    def get(self, fingerprint):
+        self.load()
+        entry = self._entries.get(fingerprint)
+        return entry and entry['plan']
+
+    def record(self, fingerprint, sql, plan):
+        """It checks the plan against the baseline, stores it and returns the flags (see `check_plan`)."""
+        baseline = self.get(fingerprint)
+        flags = check_plan(plan, baseline, self.seq_scan_rows, self.cost_tolerance)
+        with self._lock:
+            if baseline is None or self.update:
+                self._entries[fingerprint] = {'sql': sql, 'plan': plan}
+                self._dirty = True
+                if not self._registered:
+                    atexit.register(self.save)
+                    self._registered = True
+        return flags
+
+    def capture(self, cursor, db_type, sql, params, fingerprint):
+        """It explains the statement, records the plan and warns `PlanWarning` if it is flagged."""
+        plan = explain(cursor, db_type, sql, params)
+        if plan is None:
+            return None
+        flags = self.record(fingerprint, sql, plan)
+        if flags:
+            warnings.warn(
+                'The plan of the statement {} has {}.\n{}'.format(
+                    fingerprint, ', '.join(_describe(flag) for flag in flags), sql,
+                ),
+                PlanWarning,
+            )
+        return plan
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            tmp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(self._entries, f, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except (IOError, OSError):
+                logger.warning('The plan store %s could not be saved.', self.path, exc_info=True)
+                return
+            self._dirty = False
+
+    def clear(self):
+        with self._lock:
+            self._entries = None
+            self._dirty = False
+            if os.path.exists(self.path):
+                os.remove(self.path)
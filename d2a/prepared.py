@@ -0,0 +1,182 @@
+# coding: utf-8
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+
+from .utils import fingerprint, numeric_sql, qmark_sql
+
+logger = logging.getLogger(__name__)
+
+NAME_PREFIX = 'd2a_'
+
+
+def _in_transaction(cursor):
+    # psycopg2 (0 is `TRANSACTION_STATUS_IDLE`), a connection without autocommit begins one by the statement.
+    connection = getattr(cursor, 'connection', None)
+    if not hasattr(connection, 'get_transaction_status'):
+        return False
+    return not connection.autocommit or connection.get_transaction_status() != 0
+
+
+def _prepare_postgresql(cursor, name, sql):
+    sql, names = numeric_sql(sql)
+    prepare = 'PREPARE {} AS {}'.format(name, sql)
+    if not _in_transaction(cursor):
+        cursor.execute(prepare)
+        return names
+    # a failed PREPARE must not abort the transaction which the statement runs in.
+    cursor.execute('SAVEPOINT d2a_prepare')
+    try:
+        cursor.execute(prepare)
+    except Exception:
+        cursor.execute('ROLLBACK TO SAVEPOINT d2a_prepare')
+        raise
+    cursor.execute('RELEASE SAVEPOINT d2a_prepare')
+    return names
+
+
+def _execute_postgresql(cursor, name, names, params):
+    if not names:
+        return 'EXECUTE {}'.format(name), None
+    return 'EXECUTE {}({})'.format(name, ', '.join(['%s'] * len(names))), [params[n] for n in names]
+
+
+def _prepare_mysql(cursor, name, sql):
+    sql = qmark_sql(sql)
+    cursor.execute('PREPARE {} FROM %s'.format(name), [sql])
+    return sql.count('?')
+
+
+def _execute_mysql(cursor, name, count, params):
+    # the parameters are passed through user variables, it costs one more round trip.
+    if not count:
+        return 'EXECUTE {}'.format(name), None
+    variables = ['@{}_{}'.format(name, i) for i in range(count)]
+    cursor.execute('SET {}'.format(', '.join('{} = %s'.format(v) for v in variables)), list(params))
+    return 'EXECUTE {} USING {}'.format(name, ', '.join(variables)), None
+
+
+PREPARE_MAPPING = {
+    'postgresql': _prepare_postgresql,
+    'mysql': _prepare_mysql,
+}
+EXECUTE_MAPPING = {
+    'postgresql': _execute_postgresql,
+    'mysql': _execute_mysql,
+}
+DEALLOCATE_MAPPING = {
+    'postgresql': 'DEALLOCATE {}',
+    'mysql': 'DEALLOCATE PREPARE {}',
+}
+# the SQLSTATE of PostgreSQL (invalid_sql_statement_name) and the error number of MySQL (ER_UNKNOWN_STMT_HANDLER).
+MISSING_CODES = ('26000', 1243)
+# the SQLSTATE of PostgreSQL (in_failed_sql_transaction), a statement fails whatever it is.
+ABORTED_CODES = ('25P02',)
+
+
+def statement_name(sql):
+    return NAME_PREFIX + fingerprint(sql)
+
+
+def _has_code(error, codes):
+    # the error raised by the DBAPI driver is also found in the django's error which wraps it.
+    for e in (error, error.__cause__):
+        if e is None:
+            continue
+        code = getattr(e, 'pgcode', None) or (e.args[0] if e.args else None)
+        if code in codes:
+            return True
+    return False
+
+
+def is_missing(error):
+    """It returns True if the error tells that the prepared statement does not exist on the server,
+    e.g. it was deallocated by `DISCARD ALL` of a connection pooler.
+    """
+    return _has_code(error, MISSING_CODES)
+
+
+class PreparedStatements(object):
+    """Server-side prepared statements of PostgreSQL and MySQL.
+    Each distinct statement is prepared once per connection and executed with the parameters after that.
+    The least recently used statements of a connection are deallocated when the connection has more than `size`.
+
+    :param int size: The number of statements prepared on a connection.
+    """
+
+    def __init__(self, size=100):
+        self.size = size
+        # raw connections to ordered dicts of the statement names to the parameter names (or the number of them).
+        # a reconnected connection is a new one which has nothing prepared.
+        self._connections = weakref.WeakKeyDictionary()
+        # raw connections to sets of the names of the statements which could not be prepared, they run as they are.
+        self._unpreparable = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def statements(self, conn):
+        """It returns the names of the statements prepared on the connection, the least recently used first."""
+        return list(self._statements(conn))
+
+    def _statements(self, conn):
+        return self._of(self._connections, conn, OrderedDict)
+
+    def _of(self, connections, conn, factory):
+        raw = getattr(conn, 'connection', None) or conn
+        value = connections.get(raw)
+        if value is None:
+            with self._lock:
+                value = connections.setdefault(raw, factory())
+        return value
+
+    def prepare(self, conn, cursor, db_type, sql, params):
+        """It returns the sql and the parameters which execute the prepared statement,
+        or the given ones if the database type is not supported or the statement could not be prepared.
+
+        :param conn: The django connection (or the DBAPI connection) which `cursor` belongs to.
+        """
+        if db_type not in PREPARE_MAPPING:
+            return sql, params
+        statements = self._statements(conn)
+        name = statement_name(sql)
+        if name in statements:
+            statements.move_to_end(name)
+        else:
+            unpreparable = self._of(self._unpreparable, conn, set)
+            if name in unpreparable:
+                return sql, params
+            try:
+                statements[name] = PREPARE_MAPPING[db_type](cursor, name, sql)
+            except Exception as e:
+                logger.exception('The statement could not be prepared.\nsql:%s', sql)
+                # it is not tried again on the connection, unless the transaction had failed before.
+                if not _has_code(e, ABORTED_CODES):
+                    unpreparable.add(name)
+                return sql, params
+        try:
+            while len(statements) > self.size:
+                evicted, _ = statements.popitem(last=False)
+                cursor.execute(DEALLOCATE_MAPPING[db_type].format(evicted))
+            return EXECUTE_MAPPING[db_type](cursor, name, statements[name], params)
+        except Exception:
+            logger.exception('The statement could not be prepared.\nsql:%s', sql)
+            statements.pop(name, None)
+            return sql, params
+
+    def forget(self, conn, sql, cursor=None, db_type=None):
+        """It forgets the statement so that it is prepared again, e.g. after the server lost it (see `is_missing`).
+        The statement is also deallocated through `cursor` if it is given and the statement is still prepared,
+        otherwise the next PREPARE of the same name fails.
+        """
+        name = statement_name(sql)
+        if self._statements(conn).pop(name, None) is None or cursor is None or db_type not in DEALLOCATE_MAPPING:
+            return
+        try:
+            cursor.execute(DEALLOCATE_MAPPING[db_type].format(name))
+        except Exception:
+            logger.exception('The statement could not be deallocated.\nsql:%s', sql)
+
+    def clear(self):
+        with self._lock:
+            self._connections.clear()
+            self._unpreparable.clear()
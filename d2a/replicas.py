@@ -0,0 +1,91 @@
+# coding: utf-8
+import time
+import logging
+import itertools
+import threading
+from contextlib import contextmanager
+
+from django.db import connections
+from sqlalchemy.sql.expression import CompoundSelect, Select
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('round_robin', 'least_loaded')
+
+
+def _read_only(stmt):
+    return isinstance(stmt, (Select, CompoundSelect)) and getattr(stmt, '_for_update_arg', None) is None
+
+
+class ReplicaRouter(object):
+    """A chooser of the replicas which read only statements (`SELECT` without `FOR UPDATE`) run on.
+    The statements run on the primary database when no replica is available or in a transaction of the primary.
+
+    :param dict replicas: Django databases (primary) to lists of their replica databases,
+      for example ``{'default': ['replica1', 'replica2']}``.
+    :param str policy: ``round_robin`` or ``least_loaded`` (the fewest statements running in this process).
+    :param float retry_interval: Seconds while a replica which failed is not chosen.
+    """
+
+    def __init__(self, replicas={}, policy='round_robin', retry_interval=30):
+        if policy not in POLICIES:
+            raise ValueError('The policy {!r} is not one of {}.'.format(policy, ', '.join(POLICIES)))
+        self.replicas = {database: list(aliases) for database, aliases in replicas.items()}
+        self.policy = policy
+        self.retry_interval = retry_interval
+        self._counter = itertools.count()
+        self._load = {alias: 0 for aliases in self.replicas.values() for alias in aliases}
+        self._down = {}
+        self._lock = threading.Lock()
+
+    def choose(self, database, stmt):
+        """It returns the database which the statement runs on, a replica of `database` or `database` itself."""
+        aliases = self.replicas.get(database)
+        if not aliases or not _read_only(stmt) or connections[database].in_atomic_block:
+            return database
+
+        start = next(self._counter) % len(aliases)
+        aliases = aliases[start:] + aliases[:start]
+        if self.policy == 'least_loaded':
+            # the sort is stable, the replicas as loaded as each other are chosen in turn.
+            aliases = sorted(aliases, key=self._load.__getitem__)
+        for alias in aliases:
+            if self._available(alias):
+                return alias
+        return database
+
+    def _available(self, alias):
+        retry_at = self._down.get(alias)
+        if retry_at is not None and time.monotonic() < retry_at:
+            return False
+        try:
+            connections[alias].ensure_connection()
+        except Exception:
+            logger.warning('The replica %s can not be connected.', alias, exc_info=True)
+            self.mark_down(alias)
+            return False
+        self._down.pop(alias, None)
+        return True
+
+    def mark_down(self, alias):
+        """It stops choosing the replica for `retry_interval` seconds."""
+        self._down[alias] = time.monotonic() + self.retry_interval
+
+    @contextmanager
+    def using(self, alias):
+        """It counts the statement as running on the replica in the context."""
+        if alias not in self._load:
+            yield
+            return
+        with self._lock:
+            self._load[alias] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._load[alias] -= 1
+
+    def tracked(self, alias, rows):
+        """It counts the statement as running on the replica until the rows are exhausted or closed."""
+        with self.using(alias):
+            yield from rows
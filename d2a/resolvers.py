@@ -1,4 +1,8 @@
+import inspect
+from collections import OrderedDict
+
 from sqlalchemy import types as default_types
+from sqlalchemy.sql import type_api
 from sqlalchemy.dialects import (
     postgresql as postgresql_types,
     mysql as mysql_types,
@@ -9,8 +13,18 @@ from .original_types import CIText
 try:
     from geoalchemy2 import types as geotypes
 except ImportError:
-    pass
+    geotypes = None
+
+MODULES = OrderedDict([
+    ('default_types', default_types),
+    ('postgresql_types', postgresql_types),
+    ('mysql_types', mysql_types),
+    ('oracle_types', oracle_types),
+])
+if geotypes is not None:
+    MODULES['geotypes'] = geotypes
 
+# Names preferred when a type is exported by several modules, the later wins.
 alchemy_fields = [
     "default_types.INTEGER",
     "postgresql_types.INTEGER",
@@ -88,13 +102,54 @@ alchemy_fields = [
 
 forward_mapping = {}
 reverse_mapping = {}
+_resolved = {}
 
-for code in alchemy_fields:
-    try:
-        entity = eval(code)
-    except (NameError, AttributeError):
-        continue
 
+def register(entity, code):
+    """It registers the code of a type used by `sqla_codegen`, for example ``register(MyType, 'my_types.MyType')``.
+    The generated file has to import it (see `BLOCKS`).
+    """
     forward_mapping[code] = entity
     reverse_mapping[entity] = code
+    _resolved.clear()
+
+
+def resolve(entity):
+    """It returns the code of the type.
+    Types which are not registered are resolved by the nearest registered ancestor,
+    `KeyError` is raised for the others (e.g. a `TypeDecorator` which has to be registered by `register`).
+    """
+    try:
+        return _resolved[entity]
+    except KeyError:
+        pass
+
+    for cls in inspect.getmro(entity):
+        if cls in reverse_mapping:
+            code = _resolved[entity] = reverse_mapping[cls]
+            return code
+    raise KeyError(entity)
 
+
+def _is_type(value):
+    return inspect.isclass(value) and issubclass(value, default_types.TypeEngine)
+
+
+def _is_concrete_type(value):
+    # the bases and mixins of `type_api` (`TypeEngine`, `TypeDecorator`, `UserDefinedType`, `Variant`, ...)
+    # can not be instantiated as they are.
+    return _is_type(value) and value.__module__ != type_api.__name__
+
+
+for prefix, module in MODULES.items():
+    for name, entity in vars(module).items():
+        if not name.startswith('_') and _is_concrete_type(entity):
+            code = '{}.{}'.format(prefix, name)
+            forward_mapping[code] = entity
+            reverse_mapping.setdefault(entity, code)
+
+for code in alchemy_fields:
+    prefix, _, name = code.rpartition('.')
+    entity = getattr(MODULES[prefix], name, None) if prefix in MODULES else globals().get(name)
+    if _is_type(entity):
+        register(entity, code)
@@ -0,0 +1,136 @@
+# coding: utf-8
+"""Immutable snapshots of parsed models.
+
+A snapshot is built once per model from the result of `parse_model`,
+and shared by `declare` and the `sqla_codegen` command.
+The column type of each database type is resolved by `resolve_type` when it is used first.
+"""
+import threading
+import weakref
+from collections import namedtuple, OrderedDict
+from collections.abc import Mapping
+from types import MappingProxyType
+
+from .fields import DB_TYPES, ColumnType, resolve_type
+from .parsers import parse_model
+
+_EMPTY = MappingProxyType({})
+
+# registries are cleared together when the mapping changes (see `d2a.fields.alias`).
+_registries = weakref.WeakSet()
+
+ModelSchema = namedtuple('ModelSchema', ['model', 'table_name', 'fields'])
+
+
+class FieldSchema(namedtuple('FieldSchema', [
+    'name', 'logical_name', 'types', 'column_kwargs', 'fk_kwargs', 'rel_kwargs',
+])):
+    """A parsed field.
+
+    :name: The column name (the attribute name for many to many fields).
+    :logical_name: The field name of the django model, ``None`` for many to many fields.
+    :types: Database types to `ColumnType`, a database type without its own type has the `default` one.
+    :column_kwargs: Keyword arguments of `Column`.
+    :fk_kwargs: Keyword arguments of `ForeignKey`, or ``None``.
+    :rel_kwargs: Keyword arguments of `relationship` including the private ones (``__name__``), or ``None``.
+    """
+    __slots__ = ()
+
+    def column_type(self, db_type):
+        """It returns the `ColumnType` for the database type, or ``None`` if the field has no column."""
+        return self.types.get(db_type) or self.types.get('default')
+
+
+def _freeze(kwargs):
+    return MappingProxyType(dict(kwargs)) if kwargs else _EMPTY
+
+
+class _ColumnTypes(Mapping):
+    """Database types to `ColumnType` of the field, each one is resolved by `resolve_type` when it is accessed first
+    and kept after that, so the callbacks of the mapping run once per database type used.
+    """
+    __slots__ = ('_field', '_types')
+
+    def __init__(self, field):
+        self._field = field
+        self._types = {}
+
+    def __getitem__(self, db_type):
+        try:
+            column_type = self._types[db_type]
+        except KeyError:
+            if db_type not in DB_TYPES:
+                raise
+            column_type = resolve_type(self._field, db_type)
+            if column_type is not None:
+                column_type = ColumnType(column_type.type, _freeze(column_type.kwargs))
+            self._types[db_type] = column_type
+        if column_type is None:
+            raise KeyError(db_type)
+        return column_type
+
+    def __iter__(self):
+        return (db_type for db_type in DB_TYPES if db_type in self)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+def build_field(name, info, field=None):
+    """It builds `FieldSchema` from a field info returned by `parse_field`.
+
+    :param django.db.models.fields.Field field: The field of the info.
+      It is omitted for fields without columns (many to many fields), which have no column types.
+    """
+    fk_kwargs = info.get('__fk_kwargs__')
+    rel_kwargs = info.get('__rel_kwargs__')
+    # `_make` takes the fields in order, it is faster than the keyword arguments for thousands of fields.
+    return FieldSchema._make((
+        name,
+        info.get('__logical_name__'),
+        _ColumnTypes(field) if field is not None else _EMPTY,
+        # the private keys (``__type__``, ``__fk_kwargs__``, ...) are the only ones starting with ``__``.
+        _freeze({k: v for k, v in info.items() if k[:2] != '__'}),
+        _freeze(fk_kwargs) if fk_kwargs is not None else None,
+        _freeze(rel_kwargs) if rel_kwargs else None,
+    ))
+
+
+def build_schema(model, model_info):
+    """It builds `ModelSchema` from a model info returned by `parse_model`."""
+    columns = {field.column: field for field in model._meta.fields}
+    fields = OrderedDict(
+        (name, build_field(name, info, columns.get(name)))
+        for name, info in model_info['fields'].items()
+    )
+    return ModelSchema(model=model, table_name=model_info['table_name'], fields=MappingProxyType(fields))
+
+
+class SchemaRegistry(object):
+    """Snapshots of models, each model is parsed once.
+
+    :param function parse: It parses a model, `parse_model` or `SchemaCache.parse_model`.
+    """
+
+    def __init__(self, parse=parse_model):
+        self.parse = parse
+        self._schemas = {}
+        self._lock = threading.Lock()
+        _registries.add(self)
+
+    def get(self, model):
+        schema = self._schemas.get(model)
+        if schema is not None:
+            return schema
+        schema = build_schema(model, self.parse(model))
+        with self._lock:
+            return self._schemas.setdefault(model, schema)
+
+    def clear(self):
+        with self._lock:
+            self._schemas.clear()
+
+
+def clear_schemas():
+    for registry in list(_registries):
+        registry.clear()
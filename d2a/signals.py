@@ -0,0 +1,14 @@
+# coding: utf-8
+from django.dispatch import Signal
+
+# It is sent after a statement is executed by `query_expression`, `execute_expression`
+# or the engines of `make_engine` (thus `make_session`), with the following arguments:
+#   source: 'query_expression', 'execute_expression' or 'engine'.
+#   database: The django database.
+#   sql: The executed sql.
+#   fingerprint: A short hash of the sql which identifies the statement shape.
+#   compile_time, execute_time, fetch_time: Seconds spent by each phase, `None` if it is not measured.
+#   rowcount: The number of fetched (or affected) rows, `None` if the statement raised.
+#   exception: The exception raised while executing or fetching, otherwise `None`.
+# Statements are sampled by D2A_CONFIG['INSTRUMENTATION_SAMPLE_RATE'] (default: 1.0).
+statement_executed = Signal()
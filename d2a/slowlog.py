@@ -0,0 +1,130 @@
+# coding: utf-8
+import os
+import json
+import logging
+import sqlite3
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+
+from .plans import explain
+from .utils import fingerprint
+
+logger = logging.getLogger(__name__)
+
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def redact_value(value):
+    """It replaces the value with its type name, the default redaction of `SlowQueryLog`."""
+    if value is None:
+        return None
+    return '<{}>'.format(type(value).__name__)
+
+
+def _redact(params, redact):
+    if isinstance(params, dict):
+        return {k: redact(v) for k, v in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [redact(v) for v in params]
+    return params
+
+
+def _caller_stack(depth):
+    # the frames of d2a itself are excluded.
+    frames = [
+        frame for frame in traceback.extract_stack()
+        if not os.path.abspath(frame.filename).startswith(PACKAGE_DIR)
+    ]
+    return ['{}:{} in {}'.format(frame.filename, frame.lineno, frame.name) for frame in frames[-depth:]]
+
+
+class SlowQueryLog(object):
+    """A recorder of the statements which take longer than the threshold.
+    The latest entries are kept in memory, and also written into a SQLite file if `path` is given.
+
+    :param float threshold: The threshold in milliseconds.
+    :param int size: The number of entries kept in memory.
+    :param str path: The SQLite file path.
+    :param function redact: It receives a parameter value and returns the recorded one.
+      The default records the type name only, ``None`` records the values as they are.
+    :param int stack_depth: The number of frames of the caller stack.
+    :param bool explain: Whether recording the plan (see `d2a.plans.explain`) or not.
+    """
+
+    def __init__(self, threshold=500, size=100, path=None, redact=redact_value, stack_depth=10, explain=False):
+        self.threshold = threshold
+        self.path = path
+        self.redact = redact
+        self.stack_depth = stack_depth
+        self.explain = explain
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def entries(self):
+        """It returns the recorded entries in memory, the oldest first."""
+        with self._lock:
+            return list(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def check(self, cursor, sql, params, duration):
+        """It records the statement if the duration (in seconds) exceeds the threshold."""
+        duration *= 1000
+        if duration < self.threshold:
+            return None
+        try:
+            return self.record(cursor, sql, params, duration)
+        except Exception:
+            logger.exception('The slow statement could not be recorded.\nsql:%s', sql)
+            return None
+
+    def record(self, cursor, sql, params, duration):
+        entry = {
+            'time': datetime.now().isoformat(),
+            'duration': duration,
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'params': _redact(params, self.redact) if self.redact else params,
+            'stack': _caller_stack(self.stack_depth),
+            'plan': self._explain(cursor, sql, params) if self.explain else None,
+        }
+        logger.warning('A slow statement took %.1fms.\nsql:%s', duration, sql)
+        with self._lock:
+            self._entries.append(entry)
+            if self.path:
+                self._write(entry)
+        return entry
+
+    def _explain(self, cursor, sql, params):
+        # the cursor may be a server-side one which can not run another statement.
+        db = getattr(cursor, 'db', None)
+        if db is None:
+            return None
+        with db.cursor() as explain_cursor:
+            return explain(explain_cursor, db.vendor, sql, params)
+
+    def _write(self, entry):
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                if not self._initialized:
+                    conn.execute(
+                        'CREATE TABLE IF NOT EXISTS slow_queries ('
+                        'time TEXT, duration REAL, fingerprint TEXT, sql TEXT, params TEXT, stack TEXT, plan TEXT)'
+                    )
+                    self._initialized = True
+                conn.execute(
+                    'INSERT INTO slow_queries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [
+                        entry['time'], entry['duration'], entry['fingerprint'], entry['sql'],
+                        json.dumps(entry['params'], default=repr), json.dumps(entry['stack']),
+                        json.dumps(entry['plan']),
+                    ]
+                )
+        finally:
+            conn.close()
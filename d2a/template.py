@@ -1,4 +1,4 @@
-TEMPLATE = """\
+HEADER_TEMPLATE = """\
 # Code generated by d2a (https://github.com/walkframe/d2a).
 # `{{ command }}` at {{ generated_at }}.
 
@@ -46,7 +46,10 @@ def GET_DEFAULT(path):
 {{ blocks.before_models }}
 
 
-{% for model in models %}
+"""
+
+# a model in `models`, `sqla_codegen --incremental` keeps each model rendered by the default template.
+MODEL_TEMPLATE = """
 class {{ model.model_name }}(Base):
     __tablename__ = '{{ model.table_name }}'
     {% for name, args in model.columns.items %}
@@ -57,6 +60,10 @@ class {{ model.model_name }}(Base):
         {{ arg | safe }},{% endfor %}
     ){% endfor %}
 
-{% endfor %}
+"""
+
+FOOTER_TEMPLATE = """
 {{ blocks.after_models }}
 """
+
+TEMPLATE = HEADER_TEMPLATE + "{% for model in models %}" + MODEL_TEMPLATE + "{% endfor %}" + FOOTER_TEMPLATE
@@ -1,5 +1,8 @@
 # coding: utf-8
 import re
+import types
+import hashlib
+from functools import lru_cache
 
 
 def get_camelcase(s, capitalize=False):
@@ -7,3 +10,64 @@ def get_camelcase(s, capitalize=False):
     for r in reversed(rs):
         s = s[:r.start()-1] + r.group(0).upper() + s[r.end():]
     return s[0:1].capitalize() + s[1:] if capitalize else s
+
+
+@lru_cache(maxsize=500)
+def fingerprint(sql):
+    """It returns a short hash of the sql. Parameters are not rendered into it, so it identifies the statement shape."""
+    return hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16]
+
+
+def stable_repr(value):
+    """It returns `repr` of the value which is the same in every process,
+    `repr` of functions and plain objects contains their addresses which differ.
+    Functions are represented by their code, so a changed lambda has another representation.
+    """
+    if isinstance(value, dict):
+        return '{%s}' % ', '.join(
+            '{}: {}'.format(stable_repr(k), stable_repr(v)) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))
+        )
+    if isinstance(value, (set, frozenset)):
+        return '{%s}' % ', '.join(sorted(stable_repr(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return '[%s]' % ', '.join(stable_repr(v) for v in value)
+    if isinstance(value, types.CodeType):
+        return '<code {} {} {}>'.format(
+            hashlib.sha1(value.co_code).hexdigest()[:16], stable_repr(value.co_consts), stable_repr(value.co_names),
+        )
+    if isinstance(value, types.FunctionType):
+        return '{}.{}{}'.format(value.__module__, value.__qualname__, stable_repr(value.__code__))
+    if hasattr(value, '__qualname__'):
+        return '{}.{}'.format(getattr(value, '__module__', ''), value.__qualname__)
+    if hasattr(value, 'deconstruct'):
+        return stable_repr(value.deconstruct())
+    return repr(value)
+
+
+_PYFORMAT = re.compile(r'%\(([^)]+)\)s|%%')
+_FORMAT = re.compile(r'%s|%%')
+
+
+@lru_cache(maxsize=500)
+def numeric_sql(sql):
+    """It converts `pyformat` placeholders into `numeric` ones ($1, $2, ...)
+    which asyncpg and PREPARE of PostgreSQL require.
+    It returns the converted sql and the parameter names in the order of the numbers.
+    """
+    names = []
+
+    def replace(m):
+        name = m.group(1)
+        if name is None:
+            return '%'
+        if name not in names:
+            names.append(name)
+        return '${}'.format(names.index(name) + 1)
+
+    return _PYFORMAT.sub(replace, sql), tuple(names)
+
+
+@lru_cache(maxsize=500)
+def qmark_sql(sql):
+    """It converts `format` placeholders into `qmark` ones (?) which PREPARE of MySQL requires."""
+    return _FORMAT.sub(lambda m: '?' if m.group(0) == '%s' else '%', sql)
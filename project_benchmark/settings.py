@@ -0,0 +1,45 @@
+"""
+Django settings for the benchmarks.
+
+The synthetic apps define 10, 100 and 1000 models respectively (see `synthetic.make_models`).
+"""
+
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SECRET_KEY = 'benchmark'
+
+DEBUG = False
+
+INSTALLED_APPS = [
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+
+    'synthetic_10',
+    'synthetic_100',
+    'synthetic_1000',
+
+    'd2a',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'APP_DIRS': True,
+    },
+]
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+    },
+}
+
+USE_TZ = True
+
+D2A_CONFIG = {
+    # the benchmarks load models by themselves.
+    'AUTOLOAD': False,
+}
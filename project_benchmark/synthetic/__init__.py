@@ -0,0 +1,32 @@
+from django.db import models
+
+
+def make_models(module, app_label, count):
+    """It makes `count` django models in the module.
+    Each model refers the previous one by a foreign key, and every tenth model also by a many to many field.
+
+    :param str module: The module name which the models belong to.
+    :param str app_label: The app label of the models.
+    :param int count: The number of the models.
+    """
+    result = {}
+    previous = None
+    for i in range(count):
+        name = 'Model{:04d}'.format(i)
+        attrs = {
+            '__module__': module,
+            'Meta': type('Meta', (), {'app_label': app_label}),
+            'name': models.CharField(max_length=255),
+            'code': models.SlugField(unique=True),
+            'quantity': models.IntegerField(default=0),
+            'price': models.DecimalField(max_digits=10, decimal_places=2, default=0),
+            'active': models.BooleanField(default=True),
+            'description': models.TextField(null=True),
+            'created': models.DateTimeField(auto_now_add=True),
+        }
+        if previous is not None:
+            attrs['parent'] = models.ForeignKey(previous, null=True, on_delete=models.CASCADE, related_name='children')
+            if i % 10 == 9:
+                attrs['tags'] = models.ManyToManyField(previous, related_name='tagged')
+        result[name] = previous = type(name, (models.Model,), attrs)
+    return result
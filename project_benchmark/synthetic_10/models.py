@@ -0,0 +1,3 @@
+from synthetic import make_models
+
+globals().update(make_models(__name__, 'synthetic_10', 10))
@@ -0,0 +1,48 @@
+import importlib
+import types
+
+import pytest
+
+SIZES = [10, 100, 1000]
+ROUNDS = 5
+
+
+@pytest.fixture(params=SIZES, ids=lambda size: '{}models'.format(size))
+def app(request):
+    return 'synthetic_{}'.format(request.param)
+
+
+@pytest.fixture()
+def models_module(app):
+    return importlib.import_module('{}.models'.format(app))
+
+
+@pytest.fixture()
+def installed_apps(monkeypatch):
+    """It returns a function which restricts `INSTALLED_APPS` seen by the module to the given apps.
+    Overriding the django settings is avoided because it reloads the app registry.
+    """
+    def restrict(module, apps):
+        monkeypatch.setattr(module, 'settings', types.SimpleNamespace(INSTALLED_APPS=apps))
+    return restrict
+
+
+@pytest.fixture()
+def reset_registry(monkeypatch):
+    """It returns a function which forgets the models declared by d2a and the parsed snapshots of them,
+    the original ones are restored after the test.
+    """
+    import d2a
+    from d2a.schema import SchemaRegistry
+    from d2a.management.commands import sqla_codegen
+
+    def reset():
+        monkeypatch.setattr(d2a, 'bases', {})
+        monkeypatch.setattr(d2a, 'existing', {})
+        monkeypatch.setattr(d2a.db, '_routing', False)
+        schemas = SchemaRegistry(d2a.schemas.parse)
+        monkeypatch.setattr(d2a, 'schemas', schemas)
+        monkeypatch.setattr(sqla_codegen, 'schemas', schemas)
+
+    reset()
+    return reset
@@ -0,0 +1,23 @@
+import io
+
+import pytest
+from django.core.management import call_command
+
+from conftest import ROUNDS
+
+
+@pytest.mark.benchmark(group='sqla_codegen')
+@pytest.mark.parametrize('incremental', [False, True], ids=['full', 'incremental'])
+def test_sqla_codegen(benchmark, tmpdir, app, incremental, installed_apps, reset_registry):
+    from d2a.management.commands import sqla_codegen
+    installed_apps(sqla_codegen, [app])
+    path = str(tmpdir.join('models_sqla.py'))
+    args = ['sqla_codegen', '--path', path] + (['--incremental'] if incremental else [])
+    if incremental:
+        # the state file is made by the first run, nothing is changed since then.
+        call_command(*args, stdout=io.StringIO())
+
+    # every round parses the models, as a new process does.
+    benchmark.pedantic(call_command, args=args, kwargs={'stdout': io.StringIO()}, setup=reset_registry, rounds=ROUNDS)
+    with open(path) as f:
+        assert 'class Model0000(Base):' in f.read()
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import select
+
+ROWS = 1000
+
+
+@pytest.fixture()
+def table(reset_registry):
+    from d2a import declare
+    from synthetic_10.models import Model0000
+    Model0000.objects.bulk_create(
+        Model0000(name='name{}'.format(i), code='code{}'.format(i), quantity=i, price=i)
+        for i in range(ROWS)
+    )
+    return declare(Model0000).__table__
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='query_expression')
+class Test_query_expression(object):
+    def test_row_list(self, benchmark, table):
+        from d2a import query_expression
+        actual = benchmark(query_expression, select([table]))
+        assert len(actual) == ROWS
+
+    def test_stream(self, benchmark, table):
+        from d2a import query_expression
+        actual = benchmark(lambda: list(query_expression(select([table]), as_row_list=False)))
+        assert len(actual) == ROWS
+
+    def test_record(self, benchmark, table):
+        from d2a import query_expression
+        actual = benchmark(query_expression, select([table]), as_record=True)
+        assert len(actual) == ROWS
+
+    def test_columns(self, benchmark, table):
+        from d2a import query_expression
+        actual = benchmark(query_expression, select([table]), as_columns=True)
+        assert len(actual['id']) == ROWS
+
+    def test_one_row(self, benchmark, table):
+        from d2a import query_expression
+        code = 'code{}'.format(ROWS // 2)
+        actual = benchmark(query_expression, select([table]).where(table.c.code == code))
+        assert [row['code'] for row in actual] == [code]
+
+
+@pytest.mark.django_db
+@pytest.mark.benchmark(group='execute_expression')
+class Test_execute_expression(object):
+    def test_update_one_row(self, benchmark, table):
+        from d2a import execute_expression
+        actual = benchmark(execute_expression, table.update().where(table.c.code == 'code0').values(quantity=table.c.quantity + 1))
+        assert actual == 1
+
+    def test_update_all_rows(self, benchmark, table):
+        from d2a import execute_expression
+        actual = benchmark(execute_expression, table.update().values(active=False))
+        assert actual == ROWS
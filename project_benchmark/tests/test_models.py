@@ -0,0 +1,57 @@
+import sys
+
+import pytest
+
+from conftest import ROUNDS
+
+
+@pytest.mark.benchmark(group='parse_model')
+def test_parse_model(benchmark, models_module):
+    from d2a import parse_models, parse_model
+    django_models = list(parse_models(models_module).values())
+
+    actual = benchmark(lambda: [parse_model(model) for model in django_models])
+    assert len(actual) == len(django_models)
+
+
+@pytest.mark.benchmark(group='declare')
+def test_declare(benchmark, models_module, reset_registry):
+    from d2a import parse_models, declare
+    django_models = list(parse_models(models_module).values())
+
+    actual = benchmark.pedantic(
+        lambda: [declare(model) for model in django_models],
+        setup=reset_registry, rounds=ROUNDS,
+    )
+    assert len(actual) == len(django_models)
+
+
+@pytest.mark.benchmark(group='transfer')
+def test_transfer(benchmark, models_module, reset_registry):
+    from d2a import transfer
+    exports = {}
+
+    def setup():
+        reset_registry()
+        exports.clear()
+
+    benchmark.pedantic(transfer, args=(models_module, exports), setup=setup, rounds=ROUNDS)
+    assert 'Model0000' in exports
+
+
+@pytest.mark.benchmark(group='autoload')
+@pytest.mark.parametrize('config', [{}, {'lazy': True}], ids=['eager', 'lazy'])
+def test_autoload(benchmark, app, config, installed_apps, reset_registry):
+    import d2a
+    installed_apps(d2a, [app])
+    module = '{}.models_sqla'.format(app)
+
+    def setup():
+        reset_registry()
+        sys.modules.pop(module, None)
+
+    try:
+        benchmark.pedantic(d2a.autoload, args=(config,), setup=setup, rounds=ROUNDS)
+        assert hasattr(sys.modules[module], 'Model0000')
+    finally:
+        sys.modules.pop(module, None)
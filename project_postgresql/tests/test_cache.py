@@ -0,0 +1,94 @@
+import pytest
+
+
+@pytest.mark.django_db
+class Test_SchemaCache:
+    def _makeOne(self, path):
+        from d2a.cache import SchemaCache
+        return SchemaCache(str(path))
+
+    @pytest.fixture()
+    def path(self, tmpdir):
+        return tmpdir.join('d2a_schema.cache')
+
+    def test_warm_start(self, path, monkeypatch):
+        from books.models import Book
+        from d2a.parsers import parse_model
+        expected = parse_model(Book)
+
+        cache = self._makeOne(path)
+        assert cache.parse_model(Book) == expected
+        cache.save()
+        assert path.exists()
+
+        import d2a.cache
+        monkeypatch.setattr(d2a.cache, 'parse_model', lambda model: pytest.fail('parsed again'))
+        cache = self._makeOne(path)
+        actual = cache.parse_model(Book)
+        assert set(actual['fields']) == set(expected['fields'])
+        # the loaded models are kept in memory.
+        assert cache.parse_model(Book) is actual
+        rel_kwargs = actual['fields']['category']['__rel_kwargs__']
+        assert rel_kwargs['__secondary_model__'] is Book.category.through
+
+    def test_invalidated(self, path, monkeypatch):
+        from books.models import Author
+        cache = self._makeOne(path)
+        cache.parse_model(Author)
+        cache.save()
+
+        cache = self._makeOne(path)
+        monkeypatch.setattr(cache, 'make_key', lambda: 'migrated')
+        cache.load()
+        assert cache._entries == {}
+
+    def test_invalidated_by_config(self, path, settings):
+        from django.db.models import CharField
+        from d2a.fields import alias, mapping
+        cache = self._makeOne(path)
+        key = cache.make_key()
+        settings.D2A_CONFIG = dict(settings.D2A_CONFIG, NAME_FORMATTER=lambda name: name.lower())
+        lower_key = cache.make_key()
+        assert lower_key != key
+        # lambdas are told apart by their code.
+        settings.D2A_CONFIG = dict(settings.D2A_CONFIG, NAME_FORMATTER=lambda name: name.upper())
+        assert cache.make_key() not in (key, lower_key)
+
+        class AliasedField(CharField):
+            pass
+
+        key = cache.make_key()
+        alias(AliasedField, CharField)
+        try:
+            assert cache.make_key() != key
+        finally:
+            del mapping[AliasedField]
+
+    def test_connection_closed(self, path):
+        import threading
+        from django.db import connections
+        cache = self._makeOne(path)
+        connected = []
+
+        def load():
+            cache.load()
+            connected.append(connections['default'].connection)
+
+        # e.g. `autoload` on its own thread.
+        thread = threading.Thread(target=load)
+        thread.start()
+        thread.join()
+        assert cache.key is not None
+        assert connected == [None]
+
+    def test_not_picklable(self, path, monkeypatch):
+        from books.models import Author, Book
+        cache = self._makeOne(path)
+        cache.parse_model(Author)
+        info = cache.parse_model(Book)
+        monkeypatch.setitem(info, 'unpicklable', lambda: None)
+        cache.save()
+
+        cache = self._makeOne(path)
+        cache.load()
+        assert list(cache._entries) == ['books.Author']
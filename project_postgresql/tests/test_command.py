@@ -1,4 +1,5 @@
 import importlib
+import pytest
 from django.core.management import call_command
 
 
@@ -12,3 +13,81 @@ def test_save_original_template():
     from d2a.template import TEMPLATE
     with open("./original_template.tmpl", "w") as f:
         f.write(TEMPLATE)
+
+
+def test_sqla_codegen_incremental(tmpdir, monkeypatch):
+    path = str(tmpdir.join("models_sqla.py"))
+    call_command("sqla_codegen", "--path", path, "--incremental")
+    with open(path) as f:
+        expected = f.read().split("\n", 2)[2]
+    assert tmpdir.join("models_sqla.py.d2a.json").exists()
+
+    from d2a.management.commands import sqla_codegen
+    monkeypatch.setattr(sqla_codegen, "build_context", lambda *args: pytest.fail("rebuilt"))
+    monkeypatch.setattr(sqla_codegen, "render_model", lambda *args: pytest.fail("rendered"))
+    call_command("sqla_codegen", "--path", path, "--incremental")
+    with open(path) as f:
+        actual = f.read().split("\n", 2)[2]
+    assert actual == expected
+
+
+def test_sqla_codegen_incremental_through(tmpdir, monkeypatch):
+    from books.models import CategoryRelation
+    from d2a.management.commands import sqla_codegen
+    collect_models = sqla_codegen.collect_models
+    # the intermediate model comes ahead of `Category` which has its context.
+    monkeypatch.setattr(sqla_codegen, "collect_models", lambda: {
+        mod: sorted(models, key=lambda model: model is not CategoryRelation) for mod, models in collect_models().items()
+    })
+    path = str(tmpdir.join("models_sqla.py"))
+    call_command("sqla_codegen", "--path", path, "--incremental")
+
+    # only the intermediate model of `Category.related_coming` is changed.
+    fingerprint = sqla_codegen.fingerprint
+    build_context = sqla_codegen.build_context
+    built = []
+
+    def fingerprint_spy(django_model, db_type):
+        return fingerprint(django_model, db_type) + ("changed" if django_model is CategoryRelation else "")
+
+    def build_context_spy(django_model, models, db_type):
+        built.append(django_model)
+        build_context(django_model, models, db_type)
+        if django_model is CategoryRelation:
+            next(iter(models["CategoryRelation"]["columns"].values())).append("comment='changed'")
+
+    monkeypatch.setattr(sqla_codegen, "fingerprint", fingerprint_spy)
+    monkeypatch.setattr(sqla_codegen, "build_context", build_context_spy)
+    call_command("sqla_codegen", "--path", path, "--incremental")
+    assert built == [CategoryRelation]
+    with open(path) as f:
+        # the context kept with `Category` does not overwrite the rebuilt one.
+        assert "comment='changed'" in f.read()
+
+
+def test_sqla_codegen_per_app(tmpdir):
+    call_command("sqla_codegen", "--path", str(tmpdir.join("{app}_sqla.py")), "--per-app", "--jobs", "2")
+    assert tmpdir.join("books_sqla.py").exists()
+    assert tmpdir.join("sales_sqla.py").exists()
+    with open(str(tmpdir.join("books_sqla.py"))) as f:
+        content = f.read()
+    assert "class Book(Base):" in content
+    assert "class Sales(Base):" not in content
+
+
+def test_fingerprint_target_field(monkeypatch):
+    from books.models import Book
+    from d2a.management.commands.sqla_codegen import fingerprint
+    target_field = Book._meta.get_field("author").target_field
+    expected = fingerprint(Book, "postgresql")
+    name, path, args, kwargs = target_field.deconstruct()
+    monkeypatch.setattr(target_field, "deconstruct", lambda: (name, "django.db.models.BigAutoField", args, kwargs))
+    assert fingerprint(Book, "postgresql") != expected
+
+
+def test_make_config_key(monkeypatch):
+    from d2a.management.commands import sqla_codegen
+    expected = sqla_codegen.make_config_key("postgresql", None)
+    assert sqla_codegen.make_config_key("postgresql", None) == expected
+    monkeypatch.setattr(sqla_codegen, "NAME_FORMATTER", lambda name: name.lower())
+    assert sqla_codegen.make_config_key("postgresql", None) != expected
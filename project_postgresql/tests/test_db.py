@@ -55,6 +55,62 @@ class Test_query_expression:
         ]
         assert actual == expected
 
+    def test_query_expression_streaming(self, author_table, author_a, author_b):
+        from d2a.db import query_expression
+        stmt = select([
+            author_table.c.id,
+            author_table.c.name,
+        ]).select_from(author_table).order_by(author_table.c.age)
+        actual = query_expression(stmt, as_row_list=False, chunk_size=1)
+        assert not isinstance(actual, list)
+        expected = [
+            {'id': author_b.id, 'name': author_b.name},
+            {'id': author_a.id, 'name': author_a.name},
+        ]
+        assert list(actual) == expected
+
+    def test_query_expression_streaming_closed(self, monkeypatch, author_table, author_a, author_b):
+        from d2a import db
+        cursors = []
+        stream_cursor = db._stream_cursor
+
+        def stream_cursor_spy(conn, dialect):
+            cursors.append(stream_cursor(conn, dialect))
+            return cursors[-1]
+
+        monkeypatch.setattr(db, '_stream_cursor', stream_cursor_spy)
+        actual = db.query_expression(select([author_table.c.name]), as_row_list=False, chunk_size=1)
+        next(actual)
+        actual.close()
+        cursor, = cursors
+        assert cursor.closed
+
+    def test_query_expression_as_record(self, author_table, author_a, author_b):
+        from d2a.db import query_expression
+        stmt = select([
+            author_table.c.id,
+            author_table.c.name,
+        ]).select_from(author_table).order_by(author_table.c.age)
+        actual = query_expression(stmt, as_record=True)
+        assert [row.name for row in actual] == ['b', 'a']
+        assert actual == [
+            {'id': author_b.id, 'name': author_b.name},
+            {'id': author_a.id, 'name': author_a.name},
+        ]
+
+    def test_query_expression_as_columns(self, author_table, author_a, author_b):
+        numpy = pytest.importorskip('numpy')
+        from d2a.db import query_expression
+        stmt = select([
+            author_table.c.name,
+            author_table.c.age,
+        ]).select_from(author_table).order_by(author_table.c.age)
+        actual = query_expression(stmt, as_columns=True)
+        assert list(actual) == ['name', 'age']
+        assert actual['age'].dtype == numpy.int64
+        assert actual['age'].tolist() == [15, 20]
+        assert actual['name'].tolist() == ['b', 'a']
+
 
 @pytest.mark.django_db
 class Test_execute_expression:
@@ -96,6 +152,572 @@ class Test_execute_expression:
         assert actual == expected
 
 
+@pytest.mark.django_db
+class Test_execute_many:
+    def _callFUT(self, stmt, rows, **kwargs):
+        from d2a.db import execute_many
+        return execute_many(stmt, rows, **kwargs)
+
+    def test_insert_many(self, author_table, authors):
+        expected = [
+            {'name': 'a', 'age': 10},
+            {'name': 'b', 'age': 20},
+            {'name': 'c', 'age': 30},
+        ]
+        assert self._callFUT(insert(author_table), iter(expected), batch_size=2) == 3
+        actual = list(authors.values('name', 'age'))
+        assert actual == expected
+
+    def test_insert_many_failed(self, author_table):
+        from psycopg2 import DataError
+        sent = []
+        rows = [
+            {'name': 'a', 'age': 10},
+            {'name': 'b', 'age': 'not a number'},
+            {'name': 'c', 'age': 30},
+        ]
+
+        def iterate():
+            for row in rows:
+                sent.append(row['name'])
+                yield row
+
+        with pytest.raises(DataError):
+            self._callFUT(insert(author_table), iterate(), batch_size=1)
+        # the batches after the failed one are not sent.
+        assert sent == ['a', 'b']
+
+    def test_update_many(self, author_table, author_a, author_b, authors):
+        from sqlalchemy import bindparam
+        stmt = update(author_table).where(author_table.c.id == bindparam('b_id')).values(age=bindparam('b_age'))
+        rows = [
+            {'b_id': author_a.id, 'b_age': 1},
+            {'b_id': author_b.id, 'b_age': 2},
+        ]
+        assert self._callFUT(stmt, rows) == 2
+        actual = list(authors.values('name', 'age'))
+        expected = [
+            {'name': 'a', 'age': 1},
+            {'name': 'b', 'age': 2},
+        ]
+        assert actual == expected
+
+
+@pytest.mark.django_db
+class Test_copy:
+    def test_copy_into(self, author_model, authors):
+        from d2a.db import copy_into
+        rows = iter([
+            {'id': 1, 'name': 'a', 'age': 10},
+            (2, 'b "quoted"', 20, 'b@example.com'),
+            (3, '', 30, None),
+        ])
+        assert copy_into(author_model, rows) == 3
+        actual = list(authors.values('name', 'age', 'email'))
+        expected = [
+            {'name': 'a', 'age': 10, 'email': None},
+            {'name': 'b "quoted"', 'age': 20, 'email': 'b@example.com'},
+            {'name': '', 'age': 30, 'email': None},
+        ]
+        assert actual == expected
+
+    def test_copy_into_failed(self, author_model):
+        from psycopg2 import DataError
+        from d2a.db import copy_into
+        with pytest.raises(DataError):
+            copy_into(author_model, iter([(1, 'a', 'not a number', None)]))
+
+    def test_copy_out(self, author_table, author_a, author_b):
+        from d2a.db import copy_out
+        stmt = select([author_table.c.name, author_table.c.age]).where(author_table.c.age > 10).order_by(author_table.c.age)
+        actual = b''.join(copy_out(stmt, header=True))
+        assert actual == b'name,age\nb,15\na,20\n'
+
+    @pytest.mark.django_db(transaction=True)
+    def test_copy_out_streaming(self, author_table, author_a, author_b):
+        from d2a.db import copy_out, query_expression
+        chunks = copy_out(select([func.generate_series(1, 10000)]), buffer_size=1, queue_size=1)
+        actual = [next(chunks)]
+        # the connection is free while the rows are still being copied over another one.
+        assert query_expression(select([func.count()]).select_from(author_table), as_col_dict=False) == [(2,)]
+        actual.extend(chunks)
+        assert b''.join(actual).split() == [str(i).encode() for i in range(1, 10001)]
+
+    def test_copy_out_failed(self, author_table, author_a):
+        from psycopg2 import DataError
+        from d2a.db import copy_out
+        stmt = select([author_table.c.age / 0])
+        with pytest.raises(DataError):
+            list(copy_out(stmt))
+
+    def test_copy_binary_roundtrip(self, author_table, author_a, author_b, authors):
+        from d2a.db import copy_out, copy_into
+        chunks = list(copy_out(author_table, format='binary'))
+        authors.delete()
+        assert copy_into(author_table, chunks, format='binary') == 2
+        actual = list(authors.values('name', 'age'))
+        expected = [
+            {'name': 'a', 'age': 20},
+            {'name': 'b', 'age': 15},
+        ]
+        assert actual == expected
+
+
+@pytest.fixture()
+def events():
+    from d2a.signals import statement_executed
+    received = []
+
+    def receiver(sender, **kwargs):
+        received.append(kwargs)
+
+    statement_executed.connect(receiver)
+    yield received
+    statement_executed.disconnect(receiver)
+
+
+@pytest.mark.django_db
+class Test_statement_executed:
+    def test_query_expression(self, events, author_table, author_a, author_b):
+        from d2a.db import query_expression, fingerprint
+        query_expression(select([author_table.c.name]).where(author_table.c.age > 10))
+        event, = events
+        assert event['source'] == 'query_expression'
+        assert event['database'] == 'default'
+        assert event['rowcount'] == 2
+        assert event['fingerprint'] == fingerprint(event['sql'])
+        assert all(event[key] >= 0 for key in ['compile_time', 'execute_time', 'fetch_time'])
+
+    def test_streaming(self, events, author_table, author_a, author_b):
+        from d2a.db import query_expression
+        rows = query_expression(select([author_table.c.name]), as_row_list=False, chunk_size=1)
+        assert not events
+        assert len(list(rows)) == 2
+        event, = events
+        assert event['rowcount'] == 2
+        assert event['fetch_time'] >= 0
+
+    def test_same_shape_same_fingerprint(self, events, author_table):
+        from d2a.db import execute_expression
+        for age in [1, 2]:
+            execute_expression(update(author_table).where(author_table.c.age == age).values(age=0))
+        assert [event['source'] for event in events] == ['execute_expression'] * 2
+        assert events[0]['fingerprint'] == events[1]['fingerprint']
+        assert events[0]['fetch_time'] is None
+
+    def test_failed(self, events, author_table, author_a):
+        from d2a.db import query_expression
+        with pytest.raises(Exception) as excinfo:
+            query_expression(select([author_table.c.age / 0]))
+        event, = events
+        assert event['exception'] is excinfo.value
+        assert event['rowcount'] is None
+
+    def test_engine_failed(self, events):
+        from sqlalchemy import text
+        from d2a.db import make_engine, reset_engines
+        with make_engine().connect() as conn:
+            with pytest.raises(Exception) as excinfo:
+                conn.execute(text('SELECT 1 / 0'))
+            assert conn.info['d2a_timers'] == []
+        reset_engines(close=True)
+        event, = events
+        assert event['source'] == 'engine'
+        assert event['exception'] is excinfo.value.orig
+
+    def test_engine(self, events):
+        from d2a.db import make_engine, reset_engines
+        with make_engine().connect() as conn:
+            conn.execute(select([1]))
+        reset_engines(close=True)
+        event, = events
+        assert event['source'] == 'engine'
+        assert event['execute_time'] >= 0
+
+    def test_sampling(self, events, monkeypatch, author_table):
+        from d2a import db
+        monkeypatch.setattr(db, 'INSTRUMENTATION_SAMPLE_RATE', 0)
+        db.query_expression(select([author_table.c.name]))
+        assert events == []
+
+
+@pytest.mark.django_db
+class Test_plans:
+    @pytest.fixture()
+    def store(self, tmpdir, monkeypatch):
+        from d2a import db
+        from d2a.plans import PlanStore
+        store = PlanStore(str(tmpdir.join('plans.json')), seq_scan_rows=1)
+        monkeypatch.setattr(db, 'plan_store', store)
+        return store
+
+    def test_explain_expression(self, author_table):
+        from d2a.db import explain_expression
+        actual = explain_expression(select([author_table.c.name]).where(author_table.c.id == 1))
+        assert actual['cost'] > 0
+        assert actual['nodes'][0]['relation'] == 'author'
+
+    def test_seq_scan_is_warned(self, store, author_table, author_a, author_b):
+        from d2a.db import query_expression
+        from d2a.plans import PlanWarning
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE author')
+        with pytest.warns(PlanWarning, match='sequential scan on author'):
+            query_expression(select([author_table.c.name]).where(author_table.c.age > 0))
+        assert len(store._entries) == 1
+
+    def test_cost_increase_is_warned(self, store, author_table):
+        from d2a.db import query_expression
+        from d2a.plans import PlanWarning
+        store.seq_scan_rows = float('inf')
+        stmt = select([author_table.c.name]).where(author_table.c.age > 0)
+        query_expression(stmt)
+        plan, = [entry['plan'] for entry in store._entries.values()]
+        plan['cost'] /= 2
+        with pytest.warns(PlanWarning, match='cost increased'):
+            query_expression(stmt)
+
+
+@pytest.mark.django_db
+class Test_slow_query_log:
+    def _makeOne(self, monkeypatch, **kwargs):
+        from d2a import db
+        from d2a.slowlog import SlowQueryLog
+        log = SlowQueryLog(**kwargs)
+        monkeypatch.setattr(db, 'slow_query_log', log)
+        return log
+
+    def test_fast_statement(self, monkeypatch, author_table):
+        from d2a.db import query_expression
+        log = self._makeOne(monkeypatch, threshold=1000)
+        query_expression(select([author_table.c.name]))
+        assert log.entries() == []
+
+    def test_slow_statement(self, monkeypatch, tmpdir, author_table, author_a):
+        import sqlite3
+        from d2a.db import query_expression
+        path = str(tmpdir.join('slow.sqlite3'))
+        log = self._makeOne(monkeypatch, threshold=0, path=path, explain=True)
+        query_expression(select([author_table.c.name]).where(author_table.c.name == 'a'))
+        entry, = log.entries()
+        assert entry['params'] == {'name_1': '<str>'}
+        assert entry['plan']['nodes'][0]['relation'] == 'author'
+        assert any('test_slow_statement' in frame for frame in entry['stack'])
+        assert not any('/d2a/' in frame for frame in entry['stack'])
+
+        conn = sqlite3.connect(path)
+        assert conn.execute('SELECT sql, params FROM slow_queries').fetchall() == [(entry['sql'], '{"name_1": "<str>"}')]
+        conn.close()
+
+    def test_streaming(self, monkeypatch, author_table, author_a):
+        from d2a.db import query_expression
+        log = self._makeOne(monkeypatch, threshold=0, size=1, redact=None, explain=True)
+        list(query_expression(select([author_table.c.name]).where(author_table.c.name == 'a'), as_row_list=False))
+        entry, = log.entries()
+        assert entry['params'] == {'name_1': 'a'}
+
+
+@pytest.mark.django_db(transaction=True)
+class Test_prepared_statements:
+    def _makeOne(self, monkeypatch, **kwargs):
+        from d2a import db
+        from d2a.prepared import PreparedStatements
+        statements = PreparedStatements(**kwargs)
+        monkeypatch.setattr(db, 'prepared_statements', statements)
+        return statements
+
+    def _name(self, stmt):
+        from d2a.db import _compile, DIALECTS
+        from d2a.prepared import statement_name
+        return statement_name(_compile(stmt, DIALECTS['postgresql'])[0])
+
+    def _prepared(self):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM pg_prepared_statements WHERE name LIKE 'd2a%%'")
+            return [row[0] for row in cursor]
+
+    def test_prepared(self, monkeypatch, author_table, author_a, author_b):
+        from d2a.db import query_expression
+        self._makeOne(monkeypatch)
+        stmt = select([author_table.c.name]).where(author_table.c.age == author_a.age)
+        assert query_expression(stmt) == [{'name': 'a'}]
+        assert self._prepared() == [self._name(stmt)]
+        # the same shape is executed with other parameters.
+        stmt = select([author_table.c.name]).where(author_table.c.age == author_b.age)
+        assert query_expression(stmt) == [{'name': 'b'}]
+        assert query_expression(stmt, prepared=False) == [{'name': 'b'}]
+        assert self._prepared() == [self._name(stmt)]
+
+    def test_evicted(self, monkeypatch, author_table, author_a):
+        from d2a.db import query_expression, execute_expression
+        self._makeOne(monkeypatch, size=1)
+        select_stmt = select([author_table.c.name]).where(author_table.c.name == 'a')
+        update_stmt = update(author_table).where(author_table.c.name == 'a').values(age=21)
+        query_expression(select_stmt)
+        assert execute_expression(update_stmt) == 1
+        assert self._prepared() == [self._name(update_stmt)]
+        assert query_expression(select_stmt) == [{'name': 'a'}]
+        assert self._prepared() == [self._name(select_stmt)]
+
+    def test_reconnected(self, monkeypatch, author_table, author_a):
+        from django.db import connection
+        from d2a.db import query_expression
+        statements = self._makeOne(monkeypatch)
+        stmt = select([author_table.c.name]).where(author_table.c.name == 'a')
+        query_expression(stmt)
+        connection.close()
+        # the new session has nothing prepared.
+        assert query_expression(stmt) == [{'name': 'a'}]
+        assert self._prepared() == [self._name(stmt)]
+        assert statements.statements(connection) == [self._name(stmt)]
+
+    def test_deallocated(self, monkeypatch, author_table, author_a):
+        from django.db import connection
+        from d2a.db import query_expression
+        statements = self._makeOne(monkeypatch)
+        stmt = select([author_table.c.name]).where(author_table.c.name == 'a')
+        query_expression(stmt)
+        with connection.cursor() as cursor:
+            cursor.execute('DEALLOCATE ALL')
+        # the execution fails, then the statement runs as it is and is prepared again next time.
+        assert query_expression(stmt) == [{'name': 'a'}]
+        assert statements.statements(connection) == []
+        assert query_expression(stmt) == [{'name': 'a'}]
+        assert self._prepared() == [self._name(stmt)]
+
+    def test_deallocated_in_transaction(self, monkeypatch, author_table, author_a):
+        from django.db import connection, transaction
+        from d2a.db import query_expression, execute_expression
+        self._makeOne(monkeypatch)
+        stmt = select([author_table.c.name]).where(author_table.c.name == 'a')
+        query_expression(stmt)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('DEALLOCATE ALL')
+            # the failed execution does not abort the transaction.
+            assert query_expression(stmt) == [{'name': 'a'}]
+            assert query_expression(stmt) == [{'name': 'a'}]
+            update_stmt = update(author_table).where(author_table.c.name == 'a').values(age=21)
+            for _ in range(2):
+                assert execute_expression(update_stmt) == 1
+
+    def test_unpreparable(self, monkeypatch, caplog, author_table):
+        from sqlalchemy import literal
+        from d2a.db import query_expression
+        self._makeOne(monkeypatch)
+        # the types of the parameters can not be inferred.
+        stmt = select([(literal(4) / literal(2)).label('value')])
+        for _ in range(2):
+            assert query_expression(stmt) == [{'value': 2}]
+        # it is tried once on the connection.
+        assert len([r for r in caplog.records if 'could not be prepared' in r.getMessage()]) == 1
+        assert self._prepared() == []
+
+    def test_failed(self, monkeypatch, caplog, author_table, author_a):
+        from django.db import connection
+        from sqlalchemy import literal
+        from d2a.db import execute_expression
+        statements = self._makeOne(monkeypatch)
+
+        def make_stmt(divisor):
+            return update(author_table).where(author_table.c.name == 'a').values(
+                age=author_table.c.age / literal(divisor) + 1
+            )
+
+        execute_expression(make_stmt(0))
+        # the failed statement does not run again as it is.
+        assert len([r for r in caplog.records if 'division by zero' in r.exc_text]) == 1
+        assert statements.statements(connection) == [self._name(make_stmt(0))]
+        assert self._prepared() == [self._name(make_stmt(0))]
+        # the prepared statement is still used.
+        assert execute_expression(make_stmt(1)) == 1
+        author_a.refresh_from_db()
+        assert author_a.age == 21
+        assert self._prepared() == [self._name(make_stmt(1))]
+
+
+@pytest.mark.django_db(transaction=True)
+class Test_replicas:
+    @pytest.fixture()
+    def router(self, monkeypatch):
+        from d2a import db
+        from d2a.replicas import ReplicaRouter
+        router = ReplicaRouter({'default': ['replica']})
+        monkeypatch.setattr(db, 'replica_router', router)
+        return router
+
+    @pytest.fixture()
+    def used(self, monkeypatch):
+        from django.db import transaction
+        used = []
+        get_connection = transaction.get_connection
+
+        def get_connection_spy(using=None):
+            used.append(using)
+            # the replica is the same database as the default one.
+            return get_connection()
+
+        monkeypatch.setattr(transaction, 'get_connection', get_connection_spy)
+        return used
+
+    def test_unavailable(self, router, author_table, author_a):
+        from d2a.db import query_expression
+        # the replica of the test settings can not be connected.
+        assert query_expression(select([author_table.c.name])) == [{'name': 'a'}]
+        assert 'replica' in router._down
+
+    def test_routed(self, monkeypatch, router, author_table, author_a, used):
+        from d2a.db import query_expression, execute_expression
+        monkeypatch.setattr(router, '_available', lambda alias: True)
+        assert query_expression(select([author_table.c.name])) == [{'name': 'a'}]
+        assert list(query_expression(select([author_table.c.name]), as_row_list=False)) == [{'name': 'a'}]
+        assert query_expression(select([author_table.c.name]), replica=False) == [{'name': 'a'}]
+        execute_expression(update(author_table).values(age=21))
+        assert used == ['replica', 'replica', 'default', 'default']
+
+    def test_failed_on_replica(self, monkeypatch, router, author_table, author_a, used):
+        from d2a import db
+        monkeypatch.setattr(router, '_available', lambda alias: True)
+        execute_cursor = db._execute_cursor
+        results = [False]
+        monkeypatch.setattr(db, '_execute_cursor', lambda *args: results.pop() if results else execute_cursor(*args))
+        assert db.query_expression(select([author_table.c.name])) == [{'name': 'a'}]
+        assert used == ['replica', 'default']
+        assert 'replica' in router._down
+
+    def test_in_transaction(self, monkeypatch, router, used, author_table):
+        from django.db import transaction
+        from d2a.db import query_expression
+        monkeypatch.setattr(router, '_available', lambda alias: True)
+        with transaction.atomic():
+            query_expression(select([author_table.c.name]))
+        # the others are of `atomic`.
+        assert [using for using in used if using] == ['default']
+
+
+@pytest.fixture()
+def event_loop():
+    import asyncio
+    from d2a.aio import close_pools
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.run_until_complete(close_pools())
+    loop.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class Test_aquery_expression:
+    def _callFUT(self, event_loop, *stmts):
+        import asyncio
+        from d2a.aio import aquery_expression
+
+        async def run():
+            return await asyncio.gather(*[aquery_expression(stmt) for stmt in stmts])
+
+        return event_loop.run_until_complete(run())
+
+    def test_aquery_expression(self, event_loop, author_table, author_a, author_b):
+        stmt = select([
+            author_table.c.id,
+            author_table.c.name,
+        ]).select_from(author_table).order_by(author_table.c.age)
+        actual, = self._callFUT(event_loop, stmt)
+        expected = [
+            {'id': author_b.id, 'name': author_b.name},
+            {'id': author_a.id, 'name': author_a.name},
+        ]
+        assert actual == expected
+
+    def test_concurrent_statements(self, event_loop, author_table, author_a, author_b):
+        stmts = [
+            select([author_table.c.name]).where(author_table.c.id == author.id)
+            for author in [author_a, author_b, author_a]
+        ]
+        actual = self._callFUT(event_loop, *stmts)
+        assert actual == [[{'name': 'a'}], [{'name': 'b'}], [{'name': 'a'}]]
+
+    def test_failed(self, event_loop, author_table, author_a):
+        import asyncpg
+        stmt = select([author_table.c.age / 0]).select_from(author_table)
+        with pytest.raises(asyncpg.DivisionByZeroError):
+            self._callFUT(event_loop, stmt)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test_aexecute_expression:
+    def _callFUT(self, event_loop, stmt, **kwargs):
+        from d2a.aio import aexecute_expression
+        return event_loop.run_until_complete(aexecute_expression(stmt, **kwargs))
+
+    def test_update_expression(self, event_loop, author_table, author_a, author_b, authors):
+        stmt = update(author_table).where(author_table.c.age < 18).values(age=author_table.c.age + 1)
+        assert self._callFUT(event_loop, stmt) == 1
+        assert [author.age for author in authors] == [20, 16]
+
+    def test_failed(self, event_loop, author_table, author_a, authors):
+        import asyncpg
+        stmt = update(author_table).values(age=author_table.c.age / 0)
+        with pytest.raises(asyncpg.DivisionByZeroError):
+            self._callFUT(event_loop, stmt)
+        assert [author.age for author in authors] == [20]
+
+    def test_in_transaction(self, event_loop, author_table, author_a, authors):
+        from d2a.aio import get_pool, aexecute_expression
+
+        async def run():
+            pool = await get_pool()
+            async with pool.acquire() as conn:
+                async with conn.transaction():
+                    await aexecute_expression(delete(author_table), conn=conn)
+                    raise RuntimeError('rollback')
+
+        with pytest.raises(RuntimeError):
+            event_loop.run_until_complete(run())
+        assert [author.name for author in authors] == ['a']
+
+
+class Test_make_engine:
+    def _callFUT(self, **kwargs):
+        from d2a.db import make_engine
+        return make_engine(**kwargs)
+
+    def test_engine_is_shared(self):
+        assert self._callFUT() is self._callFUT()
+        assert self._callFUT(pool_size=2) is self._callFUT(pool_size=2)
+        assert self._callFUT(pool_size=2) is not self._callFUT()
+
+    def test_options(self, monkeypatch):
+        from d2a import db
+        monkeypatch.setattr(db, 'ENGINE_OPTIONS', {'pool_size': 3, 'pool_recycle': 60})
+        engine = self._callFUT(pool_size=4)
+        assert engine.pool.size() == 4
+        assert engine.pool._recycle == 60
+
+    def test_pool_options_per_pool_class(self, monkeypatch):
+        from sqlalchemy.pool import StaticPool
+        from d2a import db
+        monkeypatch.setattr(db, 'ENGINE_OPTIONS', {'pool_size': 3, 'max_overflow': 1, 'pool_timeout': 5, 'pool_recycle': 60})
+        # SQLite and `StaticPool` do not accept the options of `QueuePool`.
+        engine = self._callFUT(db_type='sqlite+memory')
+        assert engine.pool._recycle == 60
+        engine = self._callFUT(db_type='sqlite+memory', poolclass=StaticPool)
+        assert isinstance(engine.pool, StaticPool)
+        assert self._callFUT().pool.size() == 3
+
+    def test_reset_engines(self):
+        from d2a.db import reset_engines
+        engine = self._callFUT()
+        pool = engine.pool
+        with engine.connect() as conn:
+            conn.execute(select([1]))
+        reset_engines()
+        assert engine.pool is not pool
+        assert pool.checkedin() == 1
+        pool.dispose()
+
+
 @pytest.mark.skip
 class Test_make_session:
     def _callFUT(self, **kwargs):
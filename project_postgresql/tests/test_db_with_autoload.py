@@ -117,3 +117,209 @@ class Test_make_session:
             ]
             assert actual == expected
 
+
+
+class Test_lazy_transfer:
+    @pytest.fixture()
+    def registry(self, monkeypatch):
+        import d2a
+        monkeypatch.setattr(d2a, 'bases', {})
+        monkeypatch.setattr(d2a, 'existing', {})
+        monkeypatch.setattr(d2a.db, '_routing', False)
+        return d2a.existing
+
+    def test_declared_on_first_access(self, registry):
+        from d2a import lazy_transfer
+        from books import models
+        exports = {'__name__': 'books.lazy_models_sqla'}
+        lazy_transfer(models, exports)
+        assert registry == {}
+        assert 'Book' in exports['__dir__']()
+
+        book = exports['__getattr__']('Book')
+        assert exports['Book'] is book
+        declared = {model.__name__ for model in registry}
+        assert declared == {'Book', 'Author', 'Category', 'CategoryRelation', 'Book_category'}
+
+    def test_unknown_attribute(self, registry):
+        from d2a import lazy_transfer
+        from books import models
+        exports = {'__name__': 'books.lazy_models_sqla'}
+        lazy_transfer(models, exports)
+        with pytest.raises(AttributeError):
+            exports['__getattr__']('Unknown')
+
+
+@pytest.mark.django_db
+class Test_to_alchemy:
+    def _callFUT(self, queryset, **kwargs):
+        from d2a import to_alchemy
+        return to_alchemy(queryset, **kwargs)
+
+    @pytest.fixture()
+    def book(self, author_a):
+        from books.models import Book
+        return Book.objects.create(
+            price={'amount': 100}, title='t', author=author_a, content=b'abc', tags=['x', 'y'],
+        )
+
+    def test_instances(self, book, author_a):
+        from books.models import Book
+        from books.models_sqla import Book as AlchemyBook
+        actual, = self._callFUT(Book.objects.all(), chunk_size=1)
+        assert isinstance(actual, AlchemyBook)
+        assert actual.id == book.id
+        assert actual.author_id == author_a.id
+        assert actual.price == {'amount': 100}
+        assert actual.tags == ['x', 'y']
+        assert bytes(actual.content) == b'abc'
+
+    def test_as_table(self, author_model, author_a, author_b, authors):
+        actual = list(self._callFUT(authors, as_table=True))
+        assert [row.name for row in actual] == ['a', 'b']
+        assert actual[0]['age'] == 20
+        assert tuple(actual[0].keys()) == tuple(author_model.__table__.c.keys())
+
+    def test_instances_are_transient(self, author_a, authors):
+        from sqlalchemy import inspect
+        instance, = self._callFUT(authors)
+        assert inspect(instance).transient
+        assert instance.books == []
+
+
+class Test_relationship_loading:
+    def test_defaults(self):
+        from books.models_sqla import Author, Book, Category
+        # the default of SQLAlchemy unless RELATIONSHIP_LOADING is configured.
+        assert Book.category.property.lazy == 'select'
+        assert Category.related_coming.property.lazy == 'select'
+        assert Author.books.property.lazy == 'select'
+        assert Book.author.property.lazy == 'select'
+
+    def test_configured(self, monkeypatch):
+        import d2a
+        from books.models import Book
+        monkeypatch.setattr(d2a, 'bases', {})
+        monkeypatch.setattr(d2a, 'existing', {})
+        monkeypatch.setattr(d2a.db, '_routing', False)
+        monkeypatch.setattr(d2a, 'REL_PARAMS', {
+            'Book.category': {'lazy': 'joined'},
+            'Author.books': {'lazy': 'subquery'},
+        })
+        monkeypatch.setattr(d2a, 'RELATIONSHIP_LOADING', {'many_to_one': 'joined'})
+        d2a._declare_with_dependencies(Book)
+        book = d2a.existing[Book]
+        assert book.category.property.lazy == 'joined'
+        assert book.author.property.lazy == 'joined'
+        author = d2a.existing[Book._meta.get_field('author').related_model]
+        assert author.books.property.lazy == 'subquery'
+
+    def test_codegen(self, monkeypatch):
+        import d2a
+        from collections import OrderedDict
+        from books.models import Book
+        from d2a.management.commands import sqla_codegen
+        monkeypatch.setattr(d2a, 'RELATIONSHIP_LOADING', {'many_to_one': 'joined', 'one_to_many': 'selectin'})
+        monkeypatch.setattr(sqla_codegen, 'REL_PARAMS', {'*': {'backref': '{__back__}'}})
+        models = OrderedDict()
+        sqla_codegen.build_context(Book, models, 'postgresql')
+        author = models['Book']['relationships']['author']
+        assert 'lazy="joined"' in author
+        assert 'backref=sa.orm.backref("books", lazy="selectin")' in author
+        # many to many is not configured.
+        assert not any(arg.startswith('lazy=') for arg in models['Book']['relationships']['category'])
+
+
+class Test_concurrent_declare:
+    def test_models_are_declared_once(self, monkeypatch):
+        import threading
+        import d2a
+        from django.apps import apps
+        monkeypatch.setattr(d2a, 'bases', {})
+        monkeypatch.setattr(d2a, 'existing', {})
+        monkeypatch.setattr(d2a.db, '_routing', False)
+
+        django_models = list(apps.get_app_config('books').get_models())
+        barrier = threading.Barrier(8)
+        results = []
+
+        def declare_all():
+            barrier.wait()
+            results.append([d2a.declare(model) for model in django_models])
+
+        threads = [threading.Thread(target=declare_all) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 8
+        assert all(result == results[0] for result in results)
+        assert [d2a.existing[model] for model in django_models] == results[0]
+
+
+@pytest.mark.django_db
+class Test_routing:
+    @pytest.fixture()
+    def registry(self, monkeypatch):
+        import d2a
+        from django.db import router
+        monkeypatch.setattr(d2a, 'bases', {})
+        monkeypatch.setattr(d2a, 'existing', {})
+        monkeypatch.setattr(d2a.db, '_routing', False)
+        monkeypatch.setattr(
+            router, 'db_for_write', lambda model, **hints: 'replica' if model._meta.app_label == 'sales' else 'default',
+        )
+        return d2a.existing
+
+    def test_declared_per_database(self, registry):
+        import d2a
+        from sqlalchemy.orm import configure_mappers
+        from sales.models import Sales
+        from books.models import Book
+
+        d2a._declare_with_dependencies(Sales)
+        sales, book = registry[Sales], registry[Book]
+        assert sales.metadata is d2a.get_base('replica').metadata
+        assert book.metadata is d2a.get_base('default').metadata
+        # the relation across the databases is omitted, the column remains.
+        assert 'book_id' in sales.__table__.c
+        assert not sales.__table__.foreign_keys
+        assert not hasattr(sales, 'book')
+        configure_mappers()
+
+    @pytest.fixture()
+    def used(self, monkeypatch):
+        from django.db import transaction
+        used = []
+        get_connection = transaction.get_connection
+
+        def get_connection_spy(using=None):
+            used.append(using)
+            # the replica is the same database as the default one.
+            return get_connection()
+
+        monkeypatch.setattr(transaction, 'get_connection', get_connection_spy)
+        return used
+
+    def test_statements_are_routed(self, registry, used):
+        import d2a
+        from d2a.db import query_expression, detect_database
+        from sales.models import Sales
+
+        table = d2a.declare(Sales).__table__
+        stmt = select([func.count()]).select_from(table)
+        assert detect_database(stmt) == 'replica'
+        assert query_expression(stmt, as_col_dict=False) == [(0,)]
+        assert used == ['replica']
+
+    def test_debug_is_routed(self, registry, used, monkeypatch):
+        import d2a
+        from d2a import db
+        from sales.models import Sales
+
+        shown = []
+        monkeypatch.setattr(db, 'show_debug', lambda cursor, sql, params, options, database: shown.append(database))
+        table = d2a.declare(Sales).__table__
+        db.query_expression(select([func.count()]).select_from(table), debug={'show_sql': True})
+        assert shown == ['replica']
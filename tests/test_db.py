@@ -0,0 +1,210 @@
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Boolean, Column, Date, Float, Integer, MetaData, Numeric, String, Table, select
+
+
+@pytest.fixture()
+def table():
+    return Table(
+        'author', MetaData(),
+        Column('id', Integer, primary_key=True),
+        Column('name', String(255)),
+    )
+
+
+@pytest.fixture()
+def cache():
+    from d2a.db import compiled_cache
+    compiled_cache.clear()
+    yield compiled_cache
+    compiled_cache.clear()
+
+
+class Test_CompiledCache(object):
+    def _makeOne(self, maxsize):
+        from d2a.db import CompiledCache
+        return CompiledCache(maxsize)
+
+    def test_hit_and_miss(self):
+        cache = self._makeOne(2)
+        assert cache.get('a') is None
+        cache.put('a', 1)
+        assert cache.get('a') == 1
+        assert cache.info() == {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'maxsize': 2}
+
+    def test_least_recently_used_is_evicted(self):
+        cache = self._makeOne(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+        assert cache.get('b') is None
+        assert cache.get('a') == 1
+        assert cache.evictions == 1
+
+    def test_disabled(self):
+        cache = self._makeOne(0)
+        cache.put('a', 1)
+        assert len(cache) == 0
+
+
+class Test_compile(object):
+    def _callFUT(self, stmt, dialect):
+        from d2a.db import _compile, DIALECTS
+        return _compile(stmt, DIALECTS[dialect])
+
+    @pytest.mark.parametrize(
+        'dialect, expected_params',
+        [
+            ('postgresql', [{'id_1': 1, 'name_1': 'a'}, {'id_1': 2, 'name_1': 'b'}]),
+            ('mysql', [(1, 'a'), (2, 'b')]),
+            ('sqlite3', [(1, 'a'), (2, 'b')]),
+        ]
+    )
+    def test_parameters_are_rebound(self, table, cache, dialect, expected_params):
+        actual = [
+            self._callFUT(select([table.c.id]).where(table.c.id == i).where(table.c.name == n), dialect)
+            for i, n in [(1, 'a'), (2, 'b')]
+        ]
+        assert actual[0][0] == actual[1][0]
+        assert [params for _, params in actual] == expected_params
+
+        if cache.maxsize and hasattr(table, '_generate_cache_key'):
+            assert cache.info()['hits'] == 1
+            assert cache.info()['misses'] == 1
+
+    def test_expanding_parameters_are_not_cached(self, table, cache):
+        for values in [[1, 2], [1, 2, 3]]:
+            self._callFUT(select([table.c.id]).where(table.c.id.in_(values)), 'postgresql')
+        assert len(cache) == 0
+
+
+class Test_split_values(object):
+    def _callFUT(self, sql):
+        from d2a.db import _split_values
+        return _split_values(sql)
+
+    @pytest.mark.parametrize(
+        'sql, expected',
+        [
+            (
+                'INSERT INTO author (id, name) VALUES (%(id)s, lower(%(name)s))',
+                ('INSERT INTO author (id, name) VALUES %s', '(%(id)s, lower(%(name)s))'),
+            ),
+            (
+                'INSERT INTO author (name) VALUES (%(name)s) RETURNING author.id',
+                ('INSERT INTO author (name) VALUES %s RETURNING author.id', '(%(name)s)'),
+            ),
+            ('UPDATE author SET name=%(name)s', (None, None)),
+        ]
+    )
+    def test_split_values(self, sql, expected):
+        assert self._callFUT(sql) == expected
+
+
+class Test_column_array(object):
+    def _callFUT(self, values, type_):
+        from d2a.db import _column_array
+        return _column_array(values, type_)
+
+    @pytest.mark.parametrize(
+        'values, type_, expected_dtype',
+        [
+            ((1, 2), Integer(), 'int64'),
+            ((1, None), Integer(), 'object'),
+            ((1.5, None), Float(), 'float64'),
+            ((True, False), Boolean(), 'bool'),
+            ((True, None), Boolean(), 'object'),
+            ((date(2020, 1, 1), None), Date(), 'datetime64[D]'),
+            ((Decimal('1.5'),), Numeric(), 'object'),
+            ((1.5,), Numeric(asdecimal=False), 'float64'),
+            (('a', 'b'), String(), 'object'),
+        ]
+    )
+    def test_dtype(self, values, type_, expected_dtype):
+        pytest.importorskip('numpy')
+        actual = self._callFUT(values, type_)
+        assert actual.dtype == expected_dtype
+        assert len(actual) == len(values)
+
+    def test_sequences_are_elements(self):
+        pytest.importorskip('numpy')
+        actual = self._callFUT(([1, 2], [3, 4]), String())
+        assert actual.shape == (2,)
+        assert actual[0] == [1, 2]
+
+
+class Test_Row(object):
+    def _makeOne(self, keys, values):
+        from d2a.db import row_class
+        return row_class(keys)(values)
+
+    def test_access(self):
+        row = self._makeOne(('id', 'name'), (1, 'a'))
+        assert row[0] == row['id'] == row.id == 1
+        assert row.get('name') == 'a'
+        assert row.get('age') is None
+        assert list(row.keys()) == ['id', 'name']
+        assert dict(row) == {'id': 1, 'name': 'a'}
+        id_, name = row
+        assert (id_, name) == (1, 'a')
+
+    def test_missing_key(self):
+        row = self._makeOne(('id',), (1,))
+        with pytest.raises(KeyError):
+            row['name']
+        with pytest.raises(AttributeError):
+            row.name
+
+    def test_equality(self):
+        row = self._makeOne(('id', 'name'), (1, 'a'))
+        assert row == {'name': 'a', 'id': 1}
+        assert row != {'id': 1}
+        assert row == (1, 'a')
+
+    def test_class_is_shared(self):
+        from d2a.db import row_class
+        assert row_class(('id', 'name')) is row_class(('id', 'name'))
+        assert type(self._makeOne(('id',), (1,))).__slots__ == ()
+
+
+@pytest.fixture()
+def analytics_table(monkeypatch):
+    from d2a import db
+    from d2a.db import bind_metadata
+    monkeypatch.setattr(db, '_routing', False)
+    metadata = MetaData()
+    bind_metadata(metadata, 'analytics')
+    return Table('sales', metadata, Column('id', Integer, primary_key=True), Column('amount', Integer))
+
+
+class Test_detect_database(object):
+    def _callFUT(self, stmt):
+        from d2a.db import detect_database
+        return detect_database(stmt)
+
+    def test_bound(self, analytics_table):
+        assert self._callFUT(select([analytics_table.c.id]).where(analytics_table.c.amount > 1)) == 'analytics'
+        assert self._callFUT(analytics_table.update().values(amount=1)) == 'analytics'
+        assert self._callFUT(analytics_table) == 'analytics'
+
+    def test_not_bound(self, table, analytics_table):
+        assert self._callFUT(select([table.c.id])) == 'default'
+
+
+class Test_RoutingSession(object):
+    def _makeOne(self):
+        from d2a.db import RoutingSession
+        return RoutingSession()
+
+    @pytest.fixture(autouse=True)
+    def engines(self, monkeypatch):
+        monkeypatch.setattr('d2a.db.make_engine', lambda database='default': database)
+
+    def test_get_bind(self, table, analytics_table):
+        session = self._makeOne()
+        assert session.get_bind(clause=select([analytics_table.c.id])) == 'analytics'
+        assert session.get_bind(clause=select([table.c.id])) == 'default'
+        assert session.get_bind() == 'default'
@@ -21,3 +21,88 @@ class Test_alias(object):
         self._callFUT(newfield, charfield)
         from d2a.fields import mapping
         assert newfield in mapping
+
+
+class Test_resolve(object):
+    def _callFUT(self, field):
+        from d2a.fields import resolve
+        return resolve(field)
+
+    def test_subclass_resolved_by_ancestor(self, recwarn):
+        from django.db.models import CharField
+        from d2a.fields import mapping
+
+        class SubCharField(CharField):
+            pass
+
+        assert self._callFUT(SubCharField(max_length=10)) is mapping[CharField]
+        assert len(recwarn) == 0
+
+    def test_missing_warned_once(self):
+        from django.db.models import Field
+        from d2a.missing import MissingWarning
+
+        class UnknownField(Field):
+            pass
+
+        with pytest.warns(MissingWarning) as record:
+            assert self._callFUT(UnknownField()) == {}
+            assert self._callFUT(UnknownField()) == {}
+        assert len(record) == 1
+
+    def test_alias_clears_cache(self):
+        from django.db.models import CharField, TextField
+        from d2a.fields import alias, mapping
+
+        class AliasedField(CharField):
+            pass
+
+        assert self._callFUT(AliasedField()) is mapping[CharField]
+        alias(AliasedField, TextField)
+        assert self._callFUT(AliasedField()) is mapping[TextField]
+
+
+class Test_resolve_type(object):
+    def _callFUT(self, field, db_type):
+        from d2a.fields import resolve_type
+        return resolve_type(field, db_type)
+
+    @pytest.mark.parametrize(
+        'db_type, expected_type',
+        [
+            ('postgresql', 'sqlalchemy.dialects.postgresql.VARCHAR'),
+            ('oracle', 'sqlalchemy.dialects.oracle.NVARCHAR2'),
+            ('sqlite3', 'sqlalchemy.types.VARCHAR'),
+            ('unknown', 'sqlalchemy.types.VARCHAR'),
+        ]
+    )
+    def test_dispatched(self, db_type, expected_type):
+        import importlib
+        from django.db.models import CharField
+
+        module, name = expected_type.rsplit('.', 1)
+        actual = self._callFUT(CharField(max_length=10), db_type)
+        assert actual.type is getattr(importlib.import_module(module), name)
+        assert actual.kwargs == {'length': 10}
+
+    def test_foreign_key_has_type_of_target(self):
+        from django.contrib.auth.models import Permission
+        from sqlalchemy.dialects import postgresql as postgresql_types
+
+        actual = self._callFUT(Permission._meta.get_field('content_type'), 'postgresql')
+        assert actual.type is postgresql_types.INTEGER
+
+    def test_without_type(self):
+        from django.contrib.auth.models import User
+        assert self._callFUT(User.groups, 'postgresql') is None
+
+    def test_alias_recompiles(self):
+        from django.db.models import CharField, TextField
+        from d2a.fields import alias
+
+        class AliasedTextField(CharField):
+            pass
+
+        assert self._callFUT(AliasedTextField(max_length=10), 'mysql').kwargs == {'length': 10}
+        alias(AliasedTextField, TextField)
+        assert self._callFUT(AliasedTextField(max_length=10), 'mysql').kwargs == {}
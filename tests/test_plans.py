@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+
+def _plan(cost, seq_scan_rows=None):
+    nodes = [{'node_type': 'Index Scan', 'relation': 'author', 'rows': 1, 'cost': cost, 'seq_scan': False}]
+    if seq_scan_rows is not None:
+        nodes.append({'node_type': 'Seq Scan', 'relation': 'book', 'rows': seq_scan_rows, 'cost': cost, 'seq_scan': True})
+    return {'cost': cost, 'nodes': nodes}
+
+
+class Test_check_plan(object):
+    def _callFUT(self, *args, **kwargs):
+        from d2a.plans import check_plan
+        return check_plan(*args, **kwargs)
+
+    def test_seq_scan_on_large_table(self):
+        assert self._callFUT(_plan(10, seq_scan_rows=100), seq_scan_rows=100) == [
+            {'type': 'seq_scan', 'relation': 'book', 'rows': 100},
+        ]
+        assert self._callFUT(_plan(10, seq_scan_rows=99), seq_scan_rows=100) == []
+
+    def test_cost_increase(self):
+        assert self._callFUT(_plan(12), _plan(10), cost_tolerance=0.2) == []
+        assert self._callFUT(_plan(13), _plan(10), cost_tolerance=0.2) == [
+            {'type': 'cost_increase', 'baseline': 10, 'cost': 13},
+        ]
+
+
+class Test_PlanStore(object):
+    def _makeOne(self, path, **kwargs):
+        from d2a.plans import PlanStore
+        return PlanStore(str(path), **kwargs)
+
+    def test_first_plan_is_baseline(self, tmpdir):
+        path = tmpdir.join('plans.json')
+        store = self._makeOne(path)
+        assert store.record('fp', 'SELECT 1', _plan(10)) == []
+        assert store.record('fp', 'SELECT 1', _plan(20))[0]['type'] == 'cost_increase'
+        store.save()
+
+        store = self._makeOne(path)
+        assert store.get('fp') == _plan(10)
+        assert json.loads(path.read())['fp']['sql'] == 'SELECT 1'
+
+    def test_update(self, tmpdir):
+        store = self._makeOne(tmpdir.join('plans.json'), update=True)
+        store.record('fp', 'SELECT 1', _plan(10))
+        store.record('fp', 'SELECT 1', _plan(20))
+        assert store.get('fp') == _plan(20)
+
+    def test_broken_file(self, tmpdir):
+        path = tmpdir.join('plans.json')
+        path.write('{')
+        assert self._makeOne(path).get('fp') is None
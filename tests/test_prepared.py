@@ -0,0 +1,146 @@
+import pytest
+
+
+class DummyCursor(object):
+    def __init__(self, fail=()):
+        self.executed = []
+        self.fail = fail
+
+    def execute(self, sql, params=None):
+        if sql.startswith(self.fail):
+            raise Exception('failed')
+        self.executed.append((sql, params))
+
+
+class DummyConnection(object):
+    pass
+
+
+@pytest.fixture()
+def conn():
+    return DummyConnection()
+
+
+class Test_PreparedStatements(object):
+    SQL = 'SELECT author.id FROM author WHERE author.age > %(age_1)s AND author.name = %(name_1)s'
+
+    def _makeOne(self, size=100):
+        from d2a.prepared import PreparedStatements
+        return PreparedStatements(size)
+
+    def test_postgresql(self, conn):
+        from d2a.prepared import statement_name
+        statements = self._makeOne()
+        cursor = DummyCursor()
+        name = statement_name(self.SQL)
+        for _ in range(2):
+            actual = statements.prepare(conn, cursor, 'postgresql', self.SQL, {'age_1': 20, 'name_1': 'a'})
+            assert actual == ('EXECUTE {}(%s, %s)'.format(name), [20, 'a'])
+        # it is prepared once.
+        assert cursor.executed == [(
+            'PREPARE {} AS SELECT author.id FROM author WHERE author.age > $1 AND author.name = $2'.format(name),
+            None,
+        )]
+        assert statements.statements(conn) == [name]
+
+    def test_mysql(self, conn):
+        from d2a.prepared import statement_name
+        statements = self._makeOne()
+        cursor = DummyCursor()
+        name = statement_name('SELECT 1 WHERE %s = %s')
+        actual = statements.prepare(conn, cursor, 'mysql', 'SELECT 1 WHERE %s = %s', (1, 2))
+        assert actual == ('EXECUTE {0} USING @{0}_0, @{0}_1'.format(name), None)
+        assert cursor.executed == [
+            ('PREPARE {} FROM %s'.format(name), ['SELECT 1 WHERE ? = ?']),
+            ('SET @{0}_0 = %s, @{0}_1 = %s'.format(name), [1, 2]),
+        ]
+
+    def test_unsupported(self, conn):
+        statements = self._makeOne()
+        cursor = DummyCursor()
+        assert statements.prepare(conn, cursor, 'sqlite', self.SQL, {}) == (self.SQL, {})
+        assert cursor.executed == []
+
+    def test_evicted(self, conn):
+        from d2a.prepared import statement_name
+        statements = self._makeOne(size=2)
+        cursor = DummyCursor()
+        for sql in ['SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 3']:
+            statements.prepare(conn, cursor, 'postgresql', sql, {})
+        # the least recently used one is deallocated.
+        assert cursor.executed[-1] == ('DEALLOCATE {}'.format(statement_name('SELECT 2')), None)
+        assert statements.statements(conn) == [statement_name('SELECT 1'), statement_name('SELECT 3')]
+
+    def test_failed(self, conn):
+        statements = self._makeOne()
+        cursor = DummyCursor(fail='PREPARE')
+        # it falls back to the plain execution.
+        assert statements.prepare(conn, cursor, 'postgresql', self.SQL, {'age_1': 20}) == (self.SQL, {'age_1': 20})
+        assert statements.statements(conn) == []
+
+    def test_unpreparable(self, conn):
+        statements = self._makeOne()
+        statements.prepare(conn, DummyCursor(fail='PREPARE'), 'postgresql', self.SQL, {'age_1': 20})
+        cursor = DummyCursor()
+        # it is not prepared again on the connection.
+        assert statements.prepare(conn, cursor, 'postgresql', self.SQL, {'age_1': 20}) == (self.SQL, {'age_1': 20})
+        assert cursor.executed == []
+        statements.prepare(DummyConnection(), cursor, 'postgresql', self.SQL, {'age_1': 20, 'name_1': 'a'})
+        assert len(cursor.executed) == 1
+
+    def test_per_connection(self, conn):
+        statements = self._makeOne()
+        statements.prepare(conn, DummyCursor(), 'postgresql', 'SELECT 1', {})
+        other = DummyConnection()
+        assert statements.statements(other) == []
+        # the django connection wrapper is identified by its raw connection.
+        wrapper = DummyConnection()
+        wrapper.connection = conn
+        assert len(statements.statements(wrapper)) == 1
+
+    def test_forget(self, conn):
+        statements = self._makeOne()
+        statements.prepare(conn, DummyCursor(), 'postgresql', 'SELECT 1', {})
+        statements.forget(conn, 'SELECT 1')
+        assert statements.statements(conn) == []
+
+    def test_forget_deallocated(self, conn):
+        from d2a.prepared import statement_name
+        statements = self._makeOne()
+        cursor = DummyCursor()
+        statements.prepare(conn, cursor, 'postgresql', 'SELECT 1', {})
+        statements.forget(conn, 'SELECT 1', cursor, 'postgresql')
+        assert cursor.executed[-1] == ('DEALLOCATE {}'.format(statement_name('SELECT 1')), None)
+        assert statements.statements(conn) == []
+        # a statement which is not prepared is not deallocated.
+        statements.forget(conn, 'SELECT 1', cursor, 'postgresql')
+        assert len(cursor.executed) == 2
+
+
+class DummyError(Exception):
+    def __init__(self, *args, **kwargs):
+        super(DummyError, self).__init__(*args)
+        self.__dict__.update(kwargs)
+
+
+class Test_is_missing(object):
+    def _callFUT(self, error):
+        from d2a.prepared import is_missing
+        return is_missing(error)
+
+    def test_postgresql(self):
+        assert self._callFUT(DummyError('prepared statement "d2a_x" does not exist', pgcode='26000'))
+        assert not self._callFUT(DummyError('division by zero', pgcode='22012'))
+
+    def test_mysql(self):
+        assert self._callFUT(DummyError(1243, 'Unknown prepared statement handler'))
+        assert not self._callFUT(DummyError(1062, 'Duplicate entry'))
+
+    def test_wrapped(self):
+        # django raises its own error from the one of the driver.
+        error = DummyError('prepared statement "d2a_x" does not exist')
+        error.__cause__ = DummyError('prepared statement "d2a_x" does not exist', pgcode='26000')
+        assert self._callFUT(error)
+
+    def test_other(self):
+        assert not self._callFUT(Exception())
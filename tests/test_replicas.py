@@ -0,0 +1,82 @@
+import time
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, select
+
+
+class DummyConnection(object):
+    def __init__(self, available=True):
+        self.available = available
+        self.in_atomic_block = False
+
+    def ensure_connection(self):
+        if not self.available:
+            raise Exception('unavailable')
+
+
+@pytest.fixture()
+def connections(monkeypatch):
+    connections = {
+        'default': DummyConnection(),
+        'replica1': DummyConnection(),
+        'replica2': DummyConnection(),
+    }
+    monkeypatch.setattr('d2a.replicas.connections', connections)
+    return connections
+
+
+@pytest.fixture()
+def table():
+    return Table('author', MetaData(), Column('id', Integer, primary_key=True))
+
+
+class Test_ReplicaRouter(object):
+    def _makeOne(self, **kwargs):
+        from d2a.replicas import ReplicaRouter
+        return ReplicaRouter({'default': ['replica1', 'replica2']}, **kwargs)
+
+    def test_round_robin(self, connections, table):
+        router = self._makeOne()
+        actual = [router.choose('default', select([table.c.id])) for _ in range(4)]
+        assert actual == ['replica1', 'replica2', 'replica1', 'replica2']
+
+    def test_least_loaded(self, connections, table):
+        router = self._makeOne(policy='least_loaded')
+        with router.using('replica1'):
+            actual = [router.choose('default', select([table.c.id])) for _ in range(2)]
+        assert actual == ['replica2', 'replica2']
+
+    def test_streaming_is_counted(self, connections, table):
+        router = self._makeOne(policy='least_loaded')
+        rows = router.tracked('replica1', iter([1, 2]))
+        next(rows)
+        assert router.choose('default', select([table.c.id])) == 'replica2'
+        rows.close()
+        assert router._load['replica1'] == 0
+
+    def test_primary(self, connections, table):
+        router = self._makeOne()
+        assert router.choose('default', table.update().values(id=1)) == 'default'
+        assert router.choose('default', select([table.c.id]).with_for_update()) == 'default'
+        assert router.choose('other', select([table.c.id])) == 'other'
+        connections['default'].in_atomic_block = True
+        assert router.choose('default', select([table.c.id])) == 'default'
+
+    def test_unavailable(self, connections, table, monkeypatch):
+        router = self._makeOne(retry_interval=30)
+        connections['replica1'].available = False
+        assert [router.choose('default', select([table.c.id])) for _ in range(2)] == ['replica2', 'replica2']
+
+        connections['replica2'].available = False
+        assert router.choose('default', select([table.c.id])) == 'default'
+
+        # they are tried again after the interval.
+        connections['replica1'].available = connections['replica2'].available = True
+        assert router.choose('default', select([table.c.id])) == 'default'
+        now = time.monotonic()
+        monkeypatch.setattr('d2a.replicas.time.monotonic', lambda: now + 31)
+        assert router.choose('default', select([table.c.id])) in ('replica1', 'replica2')
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            self._makeOne(policy='random')
@@ -0,0 +1,51 @@
+import pytest
+
+
+class Test_resolve(object):
+    def _callFUT(self, entity):
+        from d2a.resolvers import resolve
+        return resolve(entity)
+
+    def test_registered(self):
+        from sqlalchemy.dialects.mysql import LONGTEXT
+        assert self._callFUT(LONGTEXT) == 'mysql_types.LONGTEXT'
+
+    def test_subclass(self):
+        from sqlalchemy.dialects.postgresql import JSONB
+
+        class CustomJSONB(JSONB):
+            pass
+
+        assert self._callFUT(CustomJSONB) == 'postgresql_types.JSONB'
+
+    def test_register(self):
+        from sqlalchemy.types import TypeDecorator, TEXT
+        from d2a.resolvers import register
+
+        class Encrypted(TypeDecorator):
+            impl = TEXT
+
+        register(Encrypted, 'my_types.Encrypted')
+        assert self._callFUT(Encrypted) == 'my_types.Encrypted'
+
+    def test_unregistered_decorator(self):
+        from sqlalchemy.types import TypeDecorator, UserDefinedType, TEXT
+
+        class Encrypted(TypeDecorator):
+            impl = TEXT
+
+        class Point(UserDefinedType):
+            pass
+
+        with pytest.raises(KeyError):
+            self._callFUT(Encrypted)
+        with pytest.raises(KeyError):
+            self._callFUT(Point)
+
+    def test_concrete_decorator(self):
+        from sqlalchemy.types import PickleType
+        assert self._callFUT(PickleType) == 'default_types.PickleType'
+
+    def test_not_type(self):
+        with pytest.raises(KeyError):
+            self._callFUT(object)
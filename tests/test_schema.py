@@ -0,0 +1,108 @@
+import pytest
+
+
+class Test_build_field(object):
+    def _callFUT(self, field):
+        from d2a.parsers import parse_field
+        from d2a.schema import build_field
+        return build_field('amount', parse_field(field), field)
+
+    def test_types_are_indexed(self):
+        from django.db.models import DecimalField
+        from sqlalchemy import types as default_types
+        from sqlalchemy.dialects import postgresql as postgresql_types, oracle as oracle_types
+
+        actual = self._callFUT(DecimalField(max_digits=10, decimal_places=2))
+        assert actual.column_type('postgresql') == (postgresql_types.NUMERIC, {'precision': 10, 'scale': 2})
+        assert actual.column_type('oracle').type is oracle_types.NUMBER
+        # the database types without their own type have the default one.
+        assert actual.column_type('sqlite3') == (default_types.DECIMAL, {'precision': 10, 'scale': 2})
+        assert actual.column_type('unknown') == actual.column_type('default')
+
+    def test_resolved_once(self, monkeypatch):
+        from django.db.models import DecimalField
+        from sqlalchemy.dialects import postgresql as postgresql_types
+        from d2a import schema
+        from d2a.fields import resolve_type
+        from d2a.parsers import parse_field
+
+        resolved = []
+
+        def resolve_type_spy(field, db_type):
+            resolved.append(db_type)
+            return resolve_type(field, db_type)
+
+        monkeypatch.setattr(schema, 'resolve_type', resolve_type_spy)
+        field = DecimalField(max_digits=10, decimal_places=2)
+        actual = schema.build_field('amount', parse_field(field), field)
+        assert resolved == []
+        for _ in range(2):
+            assert actual.column_type('postgresql') == (postgresql_types.NUMERIC, {'precision': 10, 'scale': 2})
+        # only the database type used is resolved, once.
+        assert resolved == ['postgresql']
+
+    def test_column_kwargs(self):
+        from django.db.models import IntegerField
+
+        actual = self._callFUT(IntegerField(null=True, default=1))
+        assert actual.column_kwargs == {'primary_key': False, 'unique': False, 'nullable': True, 'default': 1}
+        assert actual.fk_kwargs is None
+        assert actual.rel_kwargs is None
+
+    def test_without_field(self):
+        from django.db.models import IntegerField
+        from d2a.parsers import parse_field
+        from d2a.schema import build_field
+
+        actual = build_field('tags', parse_field(IntegerField()))
+        assert actual.column_type('postgresql') is None
+
+    def test_immutable(self):
+        from django.db.models import IntegerField
+
+        actual = self._callFUT(IntegerField())
+        with pytest.raises(TypeError):
+            actual.column_kwargs['nullable'] = True
+        with pytest.raises(TypeError):
+            actual.types['default'] = None
+        with pytest.raises(AttributeError):
+            actual.name = 'other'
+
+
+class Test_SchemaRegistry(object):
+    def _makeOne(self, parse):
+        from d2a.schema import SchemaRegistry
+        return SchemaRegistry(parse)
+
+    @pytest.fixture()
+    def model(self):
+        from django.contrib.contenttypes.models import ContentType
+        return ContentType
+
+    @pytest.fixture()
+    def parse(self):
+        calls = []
+
+        def parse(model):
+            calls.append(model)
+            return {'table_name': model._meta.db_table, 'fields': {}}
+        parse.calls = calls
+        return parse
+
+    def test_parsed_once(self, model, parse):
+        registry = self._makeOne(parse)
+        assert registry.get(model) is registry.get(model)
+        assert parse.calls == [model]
+
+    def test_alias_clears(self, model, parse):
+        from django.db.models import CharField
+        from d2a.fields import alias
+
+        class AliasedField(CharField):
+            pass
+
+        registry = self._makeOne(parse)
+        registry.get(model)
+        alias(AliasedField, CharField)
+        registry.get(model)
+        assert parse.calls == [model, model]
@@ -16,3 +16,50 @@ class Test_get_camelcase(object):
     def test_get_camelcase(self, snakecase, capitalize, expected):
         actual = self._callFUT(snakecase, capitalize)
         assert actual == expected
+
+
+class Test_numeric_sql(object):
+    def _callFUT(self, sql):
+        from d2a.utils import numeric_sql
+        return numeric_sql(sql)
+
+    @pytest.mark.parametrize(
+        'sql, expected',
+        [
+            (
+                'SELECT author.id FROM author WHERE author.id = %(id_1)s AND author.name = %(name_1)s',
+                ('SELECT author.id FROM author WHERE author.id = $1 AND author.name = $2', ('id_1', 'name_1')),
+            ),
+            (
+                'UPDATE author SET age=%(age)s WHERE author.age < %(age)s',
+                ('UPDATE author SET age=$1 WHERE author.age < $1', ('age',)),
+            ),
+            (
+                "SELECT author.name LIKE '%%' || %(name_1)s FROM author",
+                ("SELECT author.name LIKE '%' || $1 FROM author", ('name_1',)),
+            ),
+        ]
+    )
+    def test_numeric_sql(self, sql, expected):
+        assert self._callFUT(sql) == expected
+
+
+class Test_qmark_sql(object):
+    def _callFUT(self, sql):
+        from d2a.utils import qmark_sql
+        return qmark_sql(sql)
+
+    def test_qmark_sql(self):
+        actual = self._callFUT("SELECT author.id FROM author WHERE author.name LIKE '%%a' AND author.id = %s")
+        assert actual == "SELECT author.id FROM author WHERE author.name LIKE '%a' AND author.id = ?"
+
+
+class Test_stable_repr(object):
+    def _callFUT(self, value):
+        from d2a.utils import stable_repr
+        return stable_repr(value)
+
+    def test_functions(self):
+        assert self._callFUT(lambda name: name.lower()) == self._callFUT(lambda name: name.lower())
+        assert self._callFUT(lambda name: name.lower()) != self._callFUT(lambda name: name.upper())
+        assert '0x' not in self._callFUT({'f': lambda: None, 'types': [int, object]})